@@ -3,7 +3,14 @@
 cd ../..
 mkdir -p certs/ca certs/kme certs/sae
 chmod 700 certs certs/ca certs/kme certs/sae
-openssl genrsa -out certs/ca/ca.key 4096
+# CA_KEY_ALGO selects the CA key type: rsa (default, 4096-bit), ec (P-256)
+# or ed25519. EC/Ed25519 keys generate and sign much faster than RSA.
+case "${CA_KEY_ALGO:-rsa}" in
+    rsa) openssl genrsa -out certs/ca/ca.key 4096 ;;
+    ec) openssl ecparam -name prime256v1 -genkey -noout -out certs/ca/ca.key ;;
+    ed25519) openssl genpkey -algorithm ed25519 -out certs/ca/ca.key ;;
+    *) echo "Unsupported CA_KEY_ALGO: ${CA_KEY_ALGO} (use rsa, ec or ed25519)" >&2; exit 1 ;;
+esac
 chmod 600 certs/ca/ca.key
 cat > certs/ca/ca.conf << EOF
 [req]
@@ -4,19 +4,20 @@ Handles client authentication and SAE ID extraction.
 """
 
 import logging
+import re
 from typing import Optional
-from datetime import datetime
-from fastapi import Request, HTTPException, Depends
-from ..services.auth_service import AuthService
+from fastapi import Request, HTTPException
+
+from ..utils.timeutils import utcnow_cached
 
 logger = logging.getLogger(__name__)
 
+# Matches the Common Name RDN anywhere in a comma-separated DN
+_CN_RE = re.compile(r'(?:^|,)\s*CN=([^,]+)')
+
 
 def get_nginx_certificate_info(request: Request) -> Optional[dict]:
     """Extract certificate verification info from nginx headers."""
-    logger.info("=== Nginx Certificate Info Debug ===")
-    logger.info(f"All headers: {dict(request.headers)}")
-    
     # Get nginx certificate verification info
     client_verified = request.headers.get("X-Client-Verified")
     client_dn = request.headers.get("X-Client-DN")
@@ -24,15 +25,17 @@ def get_nginx_certificate_info(request: Request) -> Optional[dict]:
     ssl_protocol = request.headers.get("X-SSL-Protocol")
     ssl_cipher = request.headers.get("X-SSL-Cipher")
     
-    logger.info(f"X-Client-Verified: {client_verified}")
-    logger.info(f"X-Client-DN: {client_dn}")
-    logger.info(f"X-Client-Issuer: {client_issuer}")
-    logger.info(f"X-SSL-Protocol: {ssl_protocol}")
-    logger.info(f"X-SSL-Cipher: {ssl_cipher}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("=== Nginx Certificate Info Debug ===")
+        logger.debug("All headers: %s", dict(request.headers))
+        logger.debug("X-Client-Verified: %s", client_verified)
+        logger.debug("X-Client-DN: %s", client_dn)
+        logger.debug("X-Client-Issuer: %s", client_issuer)
+        logger.debug("X-SSL-Protocol: %s", ssl_protocol)
+        logger.debug("X-SSL-Cipher: %s", ssl_cipher)
     
     if client_verified == "SUCCESS" and client_dn:
         logger.info("Certificate verification successful via nginx")
-        logger.info("=== End Nginx Certificate Info Debug ===")
         return {
             "verified": client_verified,
             "dn": client_dn,
@@ -41,14 +44,23 @@ def get_nginx_certificate_info(request: Request) -> Optional[dict]:
             "ssl_cipher": ssl_cipher
         }
     else:
-        logger.warning(f"Certificate verification failed or missing: verified={client_verified}, dn={client_dn}")
-        logger.info("=== End Nginx Certificate Info Debug ===")
+        logger.warning("Certificate verification failed or missing: verified=%s, dn=%s", client_verified, client_dn)
         return None
 
 
+def get_request_certificate_info(request: Request) -> Optional[dict]:
+    """Return nginx certificate info, reading the headers at most once per request."""
+    try:
+        return request.state.cert_info
+    except AttributeError:
+        cert_info = get_nginx_certificate_info(request)
+        request.state.cert_info = cert_info
+        return cert_info
+
+
 def create_certificate_extension(request: Request, sae_id: str) -> Optional[dict]:
     """Create certificate extension data for API responses."""
-    cert_info = get_nginx_certificate_info(request)
+    cert_info = get_request_certificate_info(request)
     
     if cert_info:
         return {
@@ -57,7 +69,7 @@ def create_certificate_extension(request: Request, sae_id: str) -> Optional[dict
             "client_issuer": cert_info["issuer"],
             "ssl_protocol": cert_info.get("ssl_protocol", "unknown"),
             "ssl_cipher": cert_info.get("ssl_cipher", "unknown"),
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": utcnow_cached(),
             "sae_id": sae_id
         }
     return None
@@ -65,23 +77,18 @@ def create_certificate_extension(request: Request, sae_id: str) -> Optional[dict
 
 def authenticate_client(request: Request) -> str:
     """Authenticate client and return SAE ID from nginx certificate verification."""
-    auth_service = AuthService()
-
     # Get certificate verification info from nginx headers
-    cert_info = get_nginx_certificate_info(request)
+    cert_info = get_request_certificate_info(request)
 
     if cert_info and cert_info["verified"] == "SUCCESS":
         try:
             # Extract SAE ID from the DN (Common Name)
             # DN format: "CN=SAE_001,OU=Easy-KME Lab,O=HPE-Networking,ST=TX,C=US"
             dn = cert_info["dn"]
-            sae_id = None
             
             # Parse DN to extract CN (Common Name)
-            for part in dn.split(','):
-                if part.strip().startswith('CN='):
-                    sae_id = part.strip()[3:]  # Remove "CN=" prefix
-                    break
+            match = _CN_RE.search(dn)
+            sae_id = match.group(1).strip() if match else None
             
             if sae_id:
                 logger.info(f"Nginx certificate authentication successful for SAE: {sae_id}")
@@ -116,6 +123,14 @@ def authenticate_client(request: Request) -> str:
     )
 
 
-def get_sae_id(request: Request) -> str:
-    """Dependency to get SAE ID from request."""
-    return authenticate_client(request) 
+async def get_sae_id(request: Request) -> str:
+    """Dependency to get SAE ID from request.
+
+    Declared async so FastAPI runs it on the event loop rather than the
+    threadpool; reuses the SAE ID if the request was already authenticated.
+    """
+    sae_id = getattr(request.state, "sae_id", None)
+    if sae_id:
+        return sae_id
+    return authenticate_client(request)
+
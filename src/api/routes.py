@@ -2,9 +2,16 @@
 API routes for Easy-KME server implementing ETSI GS QKD 014 specification.
 """
 
-from fastapi import APIRouter, Request, HTTPException, Depends
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Request, Response, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from pydantic import TypeAdapter, ValidationError
+from typing import Any, Callable, Coroutine, Optional
 import logging
+import orjson
 
 from ..models.api_models import (
     KeyRequest,
@@ -12,76 +19,211 @@ from ..models.api_models import (
     KeyContainer,
     SpecKey,
     SpecKeyContainer,
-    KeyIDs,
-    KeyIDRef,
     KeyIDsSpec,
-    StatusResponse,
     StatusSpec,
-    ErrorResponse,
+    CertificateExtension,
 )
+from ..config import get_settings
 from ..services.key_service import KeyService
-from ..services.auth_service import AuthService
 from . import middleware
 
 logger = logging.getLogger(__name__)
 
+
+class KMERoute(APIRoute):
+    """Route that reports unexpected errors as 503 "Internal server error".
+
+    The error is turned into a response inside the route, so it passes back
+    through the app middleware (CORS) and is not re-raised to the server.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            try:
+                return await handler(request)
+            except (StarletteHTTPException, RequestValidationError):
+                raise
+            except Exception as e:
+                logger.error("Error in %s %s: %s", request.method, request.url.path, e)
+                return ORJSONResponse(status_code=503, content={"detail": "Internal server error"})
+
+        return route_handler
+
+
 # Create router
-router = APIRouter(prefix="/api/v1/keys", tags=["KME API"])
+router = APIRouter(prefix="/api/v1/keys", tags=["KME API"], default_response_class=ORJSONResponse,
+                   route_class=KMERoute)
+
+# Snapshot of the per-request settings, taken once at import
+settings = get_settings().snapshot()
+
+
+# Fixed error responses, built once and re-raised with a fresh traceback
+_ERR_NO_SLAVE_SAE_ID = HTTPException(status_code=400, detail="Slave SAE ID is required")
+_ERR_NO_MASTER_SAE_ID = HTTPException(status_code=400, detail="Master SAE ID is required")
+_ERR_NO_KEY_IDS = HTTPException(status_code=400, detail="Key IDs are required")
+_ERR_NO_KEY_ID_GET = HTTPException(status_code=400, detail="key_ID is required for GET")
+_ERR_NUMBER = HTTPException(status_code=400, detail="ETSI GS QKD 014: 'number' must be >= 1")
+_ERR_SIZE_MIN = HTTPException(status_code=400, detail="ETSI GS QKD 014: 'size' must be >= 8")
+_ERR_SIZE_MULTIPLE = HTTPException(status_code=400, detail="size shall be a multiple of 8")
+_ERR_NOT_AUTHORIZED = HTTPException(status_code=401, detail="Not authorized for requested keys")
+_ERR_KEYS_NOT_GENERATED = HTTPException(status_code=503, detail="Failed to generate keys")
+_ERR_KEYS_NOT_RETRIEVED = HTTPException(status_code=503, detail="Failed to retrieve keys")
+
+
+async def get_key_service(request: Request) -> KeyService:
+    """Dependency returning the application's KeyService.
+
+    The service is created by the lifespan handler at startup; it is created
+    here on first use when the app runs without lifespan (e.g. in tests).
+    """
+    key_service = getattr(request.app.state, "key_service", None)
+    if key_service is None:
+        key_service = request.app.state.key_service = KeyService()
+    return key_service
+
+
+def _certificate_extension(request: Request, sae_id: str) -> Optional[CertificateExtension]:
+    # Validated once here so every response serializes the same model
+    extension = middleware.create_certificate_extension(request, sae_id)
+    return CertificateExtension.model_validate(extension) if extension else None
+
+
+def _no_certificate_extension(request: Request, sae_id: str) -> None:
+    return None
+
+
+# Chosen once from the deployment config so handlers don't re-check it per request
+_cert_extension = (
+    _certificate_extension if settings.include_certificate_extension else _no_certificate_extension
+)
+
+
+# Request bodies are validated straight from the raw JSON bytes
+_KEY_REQUEST_ADAPTER = TypeAdapter(KeyRequestSpec)
+_KEY_IDS_ADAPTER = TypeAdapter(KeyIDsSpec)
+
+
+# Schemas of the request bodies parsed by the routes themselves; the app adds
+# them to its OpenAPI components so the references below resolve
+OPENAPI_SCHEMAS: dict = {}
+_REF_TEMPLATE = "#/components/schemas/{model}"
+
+
+def _json_body_schema(model) -> dict:
+    """OpenAPI request body for routes that parse their own JSON body."""
+    schema = model.model_json_schema(ref_template=_REF_TEMPLATE)
+    OPENAPI_SCHEMAS.update(schema.pop("$defs", {}))
+    OPENAPI_SCHEMAS[model.__name__] = schema
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {"$ref": _REF_TEMPLATE.format(model=model.__name__)}}},
+        }
+    }
+
+
+async def _validate_body(request: Request, adapter: TypeAdapter):
+    """Parse and validate the request body in one pass.
+
+    Errors are raised as RequestValidationError so they are reported the same
+    way as bodies validated by FastAPI.
+    """
+    try:
+        return adapter.validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
+
+
+async def get_key_request(request: Request) -> KeyRequestSpec:
+    """Dependency returning the validated ETSI key request body."""
+    return await _validate_body(request, _KEY_REQUEST_ADAPTER)
+
+
+async def get_key_ids(request: Request) -> KeyIDsSpec:
+    """Dependency returning the validated ETSI key IDs body."""
+    return await _validate_body(request, _KEY_IDS_ADAPTER)
+
+
+# Key containers larger than this may be streamed as NDJSON on request
+NDJSON_STREAM_THRESHOLD = 32
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _wants_ndjson(request: Request, number: Optional[int]) -> bool:
+    """True if the client accepts NDJSON and the container is large enough to stream."""
+    return (number or 1) > NDJSON_STREAM_THRESHOLD and NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _ndjson_keys(key_container: KeyContainer, cert_extension: Optional[CertificateExtension]):
+    """Yield one ETSI key object per line, then the certificate extension record if any.
+
+    The container is complete before streaming starts; this only avoids
+    building the whole JSON body in memory.
+    """
+    for k in key_container.keys:
+        yield orjson.dumps({"key_ID": k.key_id, "key": k.key_material}) + b"\n"
+    if cert_extension is not None:
+        yield orjson.dumps({"easy_kme_certificate_extension": cert_extension.model_dump(mode="json")}) + b"\n"
+
 
-# Initialize services
-key_service = KeyService()
-auth_service = AuthService()
+def _to_spec_container(key_container: KeyContainer,
+                       cert_extension: Optional[CertificateExtension]) -> SpecKeyContainer:
+    """Map an internal key container to the ETSI container without re-validation.
+
+    Keys are generated server-side, so model_construct skips the validators.
+    """
+    return SpecKeyContainer.model_construct(
+        keys=[SpecKey.model_construct(key_ID=k.key_id, key=k.key_material) for k in key_container.keys],
+        easy_kme_certificate_extension=cert_extension
+    )
 
 
 @router.get("/{slave_sae_id}/status", response_model=StatusSpec)
-async def get_status(slave_sae_id: str, request: Request):
+async def get_status(slave_sae_id: str, request: Request, key_service: KeyService = Depends(get_key_service)):
     """
     Get KME status (ETSI GS QKD 014 Get status API).
     
     Returns operational status and key pool information.
     """
-    try:
-        # Authenticate client
-        master_sae_id = middleware.authenticate_client(request)
-        
-        # Get status information
-        status_data = key_service.get_status(master_sae_id=master_sae_id, slave_sae_id=slave_sae_id)
-        settings = key_service.settings
-
-        available_keys = status_data.get("available_keys", 0)
-
-        # Create certificate extension (if enabled)
-        cert_extension = None
-        if settings.include_certificate_extension:
-            cert_extension = middleware.create_certificate_extension(request, master_sae_id)
-
-        return StatusSpec(
-            source_KME_ID=settings.kme_id,
-            target_KME_ID=settings.kme_id,
-            master_SAE_ID=master_sae_id,
-            slave_SAE_ID=slave_sae_id,
-            key_size=settings.key_size,
-            stored_key_count=available_keys,
-            max_key_count=status_data.get("max_key_pool_size", settings.key_pool_size),
-            max_key_per_request=settings.max_key_per_request,
-            max_key_size=settings.key_max_size,
-            min_key_size=settings.key_min_size,
-            max_SAE_ID_count=settings.max_sae_id_count,
-            easy_kme_certificate_extension=cert_extension
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in get_status: {e}")
-        raise HTTPException(status_code=503, detail="Internal server error")
+    # Authenticate client
+    master_sae_id = middleware.authenticate_client(request)
+    
+    # Fetch status off the event loop
+    status_data = await run_in_threadpool(
+        key_service.get_status, master_sae_id=master_sae_id, slave_sae_id=slave_sae_id
+    )
+
+    # Create certificate extension (if enabled)
+    cert_extension = _cert_extension(request, master_sae_id)
 
+    available_keys = status_data.get("available_keys", 0)
 
-@router.post("/{slave_sae_id}/enc_keys", response_model=SpecKeyContainer)
+    return StatusSpec(
+        source_KME_ID=settings.kme_id,
+        target_KME_ID=settings.kme_id,
+        master_SAE_ID=master_sae_id,
+        slave_SAE_ID=slave_sae_id,
+        key_size=settings.key_size,
+        stored_key_count=available_keys,
+        max_key_count=status_data.get("max_key_pool_size", settings.key_pool_size),
+        max_key_per_request=settings.max_key_per_request,
+        max_key_size=settings.key_max_size,
+        min_key_size=settings.key_min_size,
+        max_SAE_ID_count=settings.max_sae_id_count,
+        easy_kme_certificate_extension=cert_extension
+    )
+
+
+@router.post("/{slave_sae_id}/enc_keys", response_model=SpecKeyContainer,
+             openapi_extra=_json_body_schema(KeyRequestSpec))
 async def get_key(
     slave_sae_id: str,
-    key_request: KeyRequestSpec,
-    request: Request
+    request: Request,
+    key_request: KeyRequestSpec = Depends(get_key_request),
+    key_service: KeyService = Depends(get_key_service)
 ):
     """
     Get keys for master SAE (ETSI GS QKD 014 Get key API).
@@ -94,97 +236,64 @@ async def get_key(
     Returns:
         KeyContainer with requested keys
     """
-    try:
-        # Authenticate client
-        master_sae_id = middleware.authenticate_client(request)
-        
-        # Log the incoming request for debugging
-        logger.debug(f"=== ENC_KEYS REQUEST VALIDATION ===")
-        logger.debug(f"Request body: {key_request.dict()}")
-        logger.debug(f"Request fields: {list(key_request.dict().keys())}")
-        logger.debug(f"Request JSON payload: {key_request.model_dump_json(indent=2)}")
-        
-        # Validate that required ETSI fields are present (ETSI spec says these are optional with defaults)
-        # We'll use defaults if not provided, but we should validate the values if they are provided
-        if key_request.number is not None and key_request.number < 1:
-            raise HTTPException(status_code=400, detail="ETSI GS QKD 014: 'number' must be >= 1")
-        
-        if key_request.size is not None and key_request.size < 8:
-            raise HTTPException(status_code=400, detail="ETSI GS QKD 014: 'size' must be >= 8")
-        
-        # Validate that no non-ETSI fields are present
-        allowed_fields = {'number', 'size', 'additional_slave_SAE_IDs', 'extension_mandatory', 'extension_optional'}
-        received_fields = set(key_request.dict().keys())
-        invalid_fields = received_fields - allowed_fields
-        
-        if invalid_fields:
-            logger.warning(f"Invalid fields in request: {invalid_fields}")
-            raise HTTPException(
-                status_code=400, 
-                detail=f"ETSI GS QKD 014: Invalid fields detected: {list(invalid_fields)}. "
-                       f"Valid fields are: {list(allowed_fields)}"
-            )
-        
-        # Validate slave SAE ID
-        if not slave_sae_id:
-            raise HTTPException(status_code=400, detail="Slave SAE ID is required")
-        
-        # Validate key size is multiple of 8 (ETSI requirement)
-        if key_request.size is not None and key_request.size % 8 != 0:
-            raise HTTPException(status_code=400, detail="size shall be a multiple of 8")
-        
-        # Handle extension_mandatory (ETSI requirement)
-        if key_request.extension_mandatory:
-            # For now, we don't support any mandatory extensions
-            # In a real implementation, you would check against supported extensions
-            raise HTTPException(
-                status_code=400, 
-                detail="not all extension_mandatory parameters are supported"
-            )
-        
-        # Handle extension_optional (ETSI requirement)
-        # We can ignore these for now, but in a real implementation you might process them
-        if key_request.extension_optional:
-            logger.info(f"Ignoring extension_optional parameters: {key_request.extension_optional}")
-        
-        # Map spec request to internal model
-        internal_request = KeyRequest(
-            number=key_request.number or 1,
-            size=key_request.size or key_service.settings.key_size,
-            additional_slave_sae_ids=(key_request.additional_slave_SAE_IDs or None),
-        )
+    # Authenticate client
+    master_sae_id = middleware.authenticate_client(request)
+    
+    # Log the incoming request for debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        request_body = key_request.model_dump()
+        logger.debug("=== ENC_KEYS REQUEST VALIDATION ===")
+        logger.debug("Request body: %s", request_body)
+        logger.debug("Request fields: %s", list(request_body))
+    
+    # number, size, extension_mandatory and non-ETSI fields are validated
+    # by KeyRequestSpec at parse time and reported as 400
+    
+    # Validate slave SAE ID
+    if not slave_sae_id:
+        raise _ERR_NO_SLAVE_SAE_ID.with_traceback(None)
+    
+    # Handle extension_optional (ETSI requirement)
+    # We can ignore these for now, but in a real implementation you might process them
+    if key_request.extension_optional:
+        logger.info(f"Ignoring extension_optional parameters: {key_request.extension_optional}")
+    
+    # Map spec request to internal model (already validated as KeyRequestSpec)
+    internal_request = KeyRequest.model_construct(
+        number=key_request.number or 1,
+        size=key_request.size or settings.key_size,
+        additional_slave_sae_ids=(key_request.additional_slave_SAE_IDs or None),
+    )
 
-        # Get keys for master SAE
-        key_container = key_service.get_keys_for_master_sae(
-            master_sae_id=master_sae_id,
-            slave_sae_id=slave_sae_id,
-            key_request=internal_request
-        )
-        
-        if not key_container:
-            raise HTTPException(status_code=503, detail="Failed to generate keys")
-        
-        # Create certificate extension (if enabled)
-        cert_extension = None
-        if key_service.settings.include_certificate_extension:
-            cert_extension = middleware.create_certificate_extension(request, master_sae_id)
-        
-        # Map internal response to spec container
-        spec_keys = [SpecKey(key_ID=k.key_id, key=k.key_material) for k in key_container.keys]
-        return SpecKeyContainer(keys=spec_keys, easy_kme_certificate_extension=cert_extension)
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in get_key: {e}")
-        raise HTTPException(status_code=503, detail="Internal server error")
-
-
-@router.post("/{master_sae_id}/dec_keys", response_model=SpecKeyContainer)
+    # Get keys for master SAE
+    key_container = await run_in_threadpool(
+        key_service.get_keys_for_master_sae,
+        master_sae_id=master_sae_id,
+        slave_sae_id=slave_sae_id,
+        key_request=internal_request
+    )
+    
+    if not key_container:
+        raise _ERR_KEYS_NOT_GENERATED.with_traceback(None)
+    
+    # Create certificate extension (if enabled)
+    cert_extension = _cert_extension(request, master_sae_id)
+    
+    # Large containers are streamed one key per line when the client opts in
+    if _wants_ndjson(request, key_request.number):
+        return StreamingResponse(_ndjson_keys(key_container, cert_extension), media_type=NDJSON_MEDIA_TYPE)
+    
+    # Map internal response to spec container
+    return _to_spec_container(key_container, cert_extension)
+
+
+@router.post("/{master_sae_id}/dec_keys", response_model=SpecKeyContainer,
+             openapi_extra=_json_body_schema(KeyIDsSpec))
 async def get_key_with_key_ids(
     master_sae_id: str,
-    key_ids: KeyIDsSpec,
-    request: Request
+    request: Request,
+    key_ids: KeyIDsSpec = Depends(get_key_ids),
+    key_service: KeyService = Depends(get_key_service)
 ):
     """
     Get keys for slave SAE (ETSI GS QKD 014 Get key with key IDs API).
@@ -197,137 +306,118 @@ async def get_key_with_key_ids(
     Returns:
         KeyContainer with requested keys
     """
-    try:
-        # Authenticate client
-        slave_sae_id = middleware.authenticate_client(request)
-        
-        # Log the incoming request for debugging
-        logger.debug(f"=== DEC_KEYS REQUEST VALIDATION ===")
-        logger.debug(f"Request body: {key_ids.dict()}")
-        logger.debug(f"Request fields: {list(key_ids.dict().keys())}")
-        logger.debug(f"Request JSON payload: {key_ids.model_dump_json(indent=2)}")
-        
-        # Validate master SAE ID
-        if not master_sae_id:
-            raise HTTPException(status_code=400, detail="Master SAE ID is required")
-        
-        # Validate key IDs
-        if not key_ids.key_IDs:
-            logger.warning(f"Empty key_IDs array in request: {key_ids.dict()}")
-            raise HTTPException(status_code=400, detail="Key IDs are required")
-        
-        # Validate key ID structure
-        for i, key_ref in enumerate(key_ids.key_IDs):
-            if not key_ref.key_ID:
-                logger.warning(f"Empty key_ID at index {i} in request: {key_ids.dict()}")
-                raise HTTPException(status_code=400, detail=f"Key ID at index {i} is empty")
-        
-        # Check authorization
-        key_id_list = [ref.key_ID for ref in key_ids.key_IDs]
-        if not auth_service.is_slave_authorized_for_keys(slave_sae_id=slave_sae_id, key_ids=key_id_list, master_sae_id=master_sae_id):
-            raise HTTPException(status_code=401, detail="Not authorized for requested keys")
-        
-        # Get keys for slave SAE
-        key_container = key_service.get_keys_for_slave_sae(
-            slave_sae_id=slave_sae_id,
-            master_sae_id=master_sae_id,
-            key_ids=key_id_list
-        )
-        
-        if not key_container:
-            raise HTTPException(status_code=503, detail="Failed to retrieve keys")
-        
-        # Create certificate extension (if enabled)
-        cert_extension = None
-        if key_service.settings.include_certificate_extension:
-            cert_extension = middleware.create_certificate_extension(request, slave_sae_id)
-        
-        spec_keys = [SpecKey(key_ID=k.key_id, key=k.key_material) for k in key_container.keys]
-        return SpecKeyContainer(keys=spec_keys, easy_kme_certificate_extension=cert_extension)
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in get_key_with_key_ids: {e}")
-        raise HTTPException(status_code=503, detail="Internal server error")
+    # Authenticate client
+    slave_sae_id = middleware.authenticate_client(request)
+    
+    # Log the incoming request for debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        request_body = key_ids.model_dump()
+        logger.debug("=== DEC_KEYS REQUEST VALIDATION ===")
+        logger.debug("Request body: %s", request_body)
+        logger.debug("Request fields: %s", list(request_body))
+    
+    # Validate master SAE ID
+    if not master_sae_id:
+        raise _ERR_NO_MASTER_SAE_ID.with_traceback(None)
+    
+    # Validate key IDs
+    if not key_ids.key_IDs:
+        logger.warning("Empty key_IDs array in request: %s", key_ids.model_dump())
+        raise _ERR_NO_KEY_IDS.with_traceback(None)
+    
+    # Validate key ID structure
+    for i, key_ref in enumerate(key_ids.key_IDs):
+        if not key_ref.key_ID:
+            logger.warning("Empty key_ID at index %d in request: %s", i, key_ids.model_dump())
+            raise HTTPException(status_code=400, detail=f"Key ID at index {i} is empty")
+    
+    # Authorize and fetch keys for slave SAE in a single storage pass
+    key_id_list = [ref.key_ID for ref in key_ids.key_IDs]
+    authorized, key_container = await run_in_threadpool(
+        key_service.fetch_and_authorize,
+        slave_sae_id=slave_sae_id,
+        master_sae_id=master_sae_id,
+        key_ids=key_id_list
+    )
+    if not authorized:
+        raise _ERR_NOT_AUTHORIZED.with_traceback(None)
+    
+    if not key_container:
+        raise _ERR_KEYS_NOT_RETRIEVED.with_traceback(None)
+    
+    # Create certificate extension (if enabled)
+    cert_extension = _cert_extension(request, slave_sae_id)
+    
+    return _to_spec_container(key_container, cert_extension)
 
 
 @router.get("/{slave_sae_id}/enc_keys", response_model=SpecKeyContainer)
-async def get_key_get(slave_sae_id: str, request: Request, number: Optional[int] = None, size: Optional[int] = None):
+async def get_key_get(slave_sae_id: str, request: Request, number: Optional[int] = None, size: Optional[int] = None,
+                      key_service: KeyService = Depends(get_key_service)):
     """GET variant for simple cases: number and/or size query params."""
+    master_sae_id = middleware.authenticate_client(request)
+    
+    # Log the incoming request for debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("=== ENC_KEYS GET REQUEST VALIDATION ===")
+        logger.debug("Query parameters: number=%s, size=%s", number, size)
+    
+    # Validate that required ETSI fields are present (for GET, we use defaults if not provided)
+    # This is less strict than POST since GET is meant for simple cases
+    if number is not None and number < 1:
+        raise _ERR_NUMBER.with_traceback(None)
+    
+    if size is not None and size < 8:
+        raise _ERR_SIZE_MIN.with_traceback(None)
+    
+    # Validate key size is multiple of 8 (ETSI requirement)
+    if size is not None and size % 8 != 0:
+        raise _ERR_SIZE_MULTIPLE.with_traceback(None)
+    
     try:
-        master_sae_id = middleware.authenticate_client(request)
-        
-        # Log the incoming request for debugging
-        logger.debug(f"=== ENC_KEYS GET REQUEST VALIDATION ===")
-        logger.debug(f"Query parameters: number={number}, size={size}")
-        
-        # Validate that required ETSI fields are present (for GET, we use defaults if not provided)
-        # This is less strict than POST since GET is meant for simple cases
-        if number is not None and number < 1:
-            raise HTTPException(status_code=400, detail="ETSI GS QKD 014: 'number' must be >= 1")
-        
-        if size is not None and size < 8:
-            raise HTTPException(status_code=400, detail="ETSI GS QKD 014: 'size' must be >= 8")
-        
-        # Validate key size is multiple of 8 (ETSI requirement)
-        if size is not None and size % 8 != 0:
-            raise HTTPException(status_code=400, detail="size shall be a multiple of 8")
-        
         internal_request = KeyRequest(
             number=number or 1,
-            size=size or key_service.settings.key_size,
+            size=size or settings.key_size,
         )
-        key_container = key_service.get_keys_for_master_sae(
-            master_sae_id=master_sae_id,
-            slave_sae_id=slave_sae_id,
-            key_request=internal_request,
-        )
-        if not key_container:
-            raise HTTPException(status_code=503, detail="Failed to generate keys")
-        
-        # Create certificate extension (if enabled)
-        cert_extension = None
-        if key_service.settings.include_certificate_extension:
-            cert_extension = middleware.create_certificate_extension(request, master_sae_id)
-        
-        spec_keys = [SpecKey(key_ID=k.key_id, key=k.key_material) for k in key_container.keys]
-        return SpecKeyContainer(keys=spec_keys, easy_kme_certificate_extension=cert_extension)
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in get_key_get: {e}")
-        raise HTTPException(status_code=503, detail="Internal server error")
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("query", *err["loc"])} for err in e.errors()])
+    key_container = await run_in_threadpool(
+        key_service.get_keys_for_master_sae,
+        master_sae_id=master_sae_id,
+        slave_sae_id=slave_sae_id,
+        key_request=internal_request,
+    )
+    if not key_container:
+        raise _ERR_KEYS_NOT_GENERATED.with_traceback(None)
+    
+    # Create certificate extension (if enabled)
+    cert_extension = _cert_extension(request, master_sae_id)
+    
+    if _wants_ndjson(request, number):
+        return StreamingResponse(_ndjson_keys(key_container, cert_extension), media_type=NDJSON_MEDIA_TYPE)
+    
+    return _to_spec_container(key_container, cert_extension)
 
 
 @router.get("/{master_sae_id}/dec_keys", response_model=SpecKeyContainer)
-async def get_key_with_key_ids_get(master_sae_id: str, request: Request, key_ID: Optional[str] = None):
+async def get_key_with_key_ids_get(master_sae_id: str, request: Request, key_ID: Optional[str] = None,
+                                   key_service: KeyService = Depends(get_key_service)):
     """GET variant for simple case: single key_ID query param."""
-    try:
-        slave_sae_id = middleware.authenticate_client(request)
-        if not key_ID:
-            raise HTTPException(status_code=400, detail="key_ID is required for GET")
-        if not auth_service.is_slave_authorized_for_keys(slave_sae_id=slave_sae_id, key_ids=[key_ID], master_sae_id=master_sae_id):
-            raise HTTPException(status_code=401, detail="Not authorized for requested keys")
-        key_container = key_service.get_keys_for_slave_sae(
-            slave_sae_id=slave_sae_id,
-            master_sae_id=master_sae_id,
-            key_ids=[key_ID],
-        )
-        if not key_container:
-            raise HTTPException(status_code=503, detail="Failed to retrieve keys")
-        
-        # Create certificate extension (if enabled)
-        cert_extension = None
-        if key_service.settings.include_certificate_extension:
-            cert_extension = middleware.create_certificate_extension(request, slave_sae_id)
-        
-        spec_keys = [SpecKey(key_ID=k.key_id, key=k.key_material) for k in key_container.keys]
-        return SpecKeyContainer(keys=spec_keys, easy_kme_certificate_extension=cert_extension)
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in get_key_with_key_ids_get: {e}")
-        raise HTTPException(status_code=503, detail="Internal server error")
-
-
-# Note: Router-level exception handlers are not supported in FastAPI
+    slave_sae_id = middleware.authenticate_client(request)
+    if not key_ID:
+        raise _ERR_NO_KEY_ID_GET.with_traceback(None)
+    authorized, key_container = await run_in_threadpool(
+        key_service.fetch_and_authorize,
+        slave_sae_id=slave_sae_id,
+        master_sae_id=master_sae_id,
+        key_ids=[key_ID],
+    )
+    if not authorized:
+        raise _ERR_NOT_AUTHORIZED.with_traceback(None)
+    if not key_container:
+        raise _ERR_KEYS_NOT_RETRIEVED.with_traceback(None)
+    
+    # Create certificate extension (if enabled)
+    cert_extension = _cert_extension(request, slave_sae_id)
+    
+    return _to_spec_container(key_container, cert_extension)
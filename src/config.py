@@ -4,7 +4,21 @@ Simple environment-backed settings with validation (no external dependencies).
 """
 
 import os
+from functools import lru_cache
 from pathlib import Path
+from typing import NamedTuple
+
+
+class SettingsSnapshot(NamedTuple):
+    """Immutable bundle of the settings read on every API request."""
+    kme_id: str
+    key_size: int
+    key_pool_size: int
+    max_key_per_request: int
+    key_max_size: int
+    key_min_size: int
+    max_sae_id_count: int
+    include_certificate_extension: bool
 
 
 class Settings:
@@ -30,6 +44,7 @@ class Settings:
         self.require_client_cert: bool = os.getenv("REQUIRE_CLIENT_CERT", "true").lower() == "true"
         self.verify_ca: bool = os.getenv("VERIFY_CA", "true").lower() == "true"
         self.allow_header_auth: bool = os.getenv("ALLOW_HEADER_AUTH", "false").lower() == "true"
+        self.cert_cache_ttl: float = float(os.getenv("CERT_CACHE_TTL", "300"))
     
         # Logging Configuration
         self.log_level: str = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -51,6 +66,19 @@ class Settings:
         # Validate and normalize
         self._validate()
 
+    def snapshot(self) -> SettingsSnapshot:
+        """Return the per-request settings as an immutable tuple."""
+        return SettingsSnapshot(
+            kme_id=self.kme_id,
+            key_size=self.key_size,
+            key_pool_size=self.key_pool_size,
+            max_key_per_request=self.max_key_per_request,
+            key_max_size=self.key_max_size,
+            key_min_size=self.key_min_size,
+            max_sae_id_count=self.max_sae_id_count,
+            include_certificate_extension=self.include_certificate_extension,
+        )
+
     def _validate(self):
         # Validate log level
         valid_levels = {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}
@@ -62,15 +90,18 @@ class Settings:
 
         # Validate cert files exist
         for path in (self.kme_cert_path, self.kme_key_path, self.ca_cert_path):
-            p = Path(path)
-            if not (p.exists() or p.is_symlink()):
-                raise ValueError(f"Certificate file not found: {path}")
-
+            self.validate_cert_path(path)
 
-from functools import lru_cache
+    @staticmethod
+    def validate_cert_path(path: str) -> str:
+        """Return ``path`` if a certificate file (or symlink) exists there."""
+        p = Path(path)
+        if not (p.exists() or p.is_symlink()):
+            raise ValueError(f"Certificate file not found: {path}")
+        return path
 
 
-@lru_cache
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
     """Create and cache the Settings instance."""
     return Settings()
@@ -7,61 +7,111 @@ Main application entry point.
 from dotenv import load_dotenv
 load_dotenv()
 
+import hashlib
 import logging
+import logging.handlers
+import queue
+import ssl
+from contextlib import asynccontextmanager
+from urllib.parse import unquote
+
+import orjson
 import uvicorn
+from cryptography import x509
+from cryptography.hazmat.backends.openssl.backend import backend as openssl_backend
 from fastapi import FastAPI, Request, Response
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from starlette.background import BackgroundTask
 
 from .config import get_settings
-from .api.routes import router
+from .api.routes import router, OPENAPI_SCHEMAS
+from .services.key_service import KeyService
+from .services.lookup_cache import TTLCache
+from .models.api_models import KeyRequestSpec
 
 # Configure logging
 import os
 os.makedirs('logs', exist_ok=True)
 
-# Get settings for logging configuration
+# Settings are loaded once and shared by the handlers below
 settings = get_settings()
 log_level = getattr(logging, settings.log_level.upper(), logging.INFO)
+DEBUG_ENABLED = log_level == logging.DEBUG
 
-# Configure logging handlers
-handlers = []
-
-# Console handler (always present)
-console_handler = logging.StreamHandler()
-console_handler.setLevel(log_level)
-console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(console_formatter)
-handlers.append(console_handler)
-
-# File handler for debug logs (only when log level is DEBUG)
-if log_level == logging.DEBUG:
-    file_handler = logging.FileHandler('logs/debug.log')
-    file_handler.setLevel(logging.DEBUG)
-    file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(file_formatter)
-    handlers.append(file_handler)
-
-# Configure root logger
-logging.basicConfig(
-    level=log_level,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=handlers
-)
+# Configure root logger handlers once; a second import of this module (e.g.
+# as both src.main and __main__) must not attach duplicate handlers
+root_logger = logging.getLogger()
+log_listener = None
+if not root_logger.handlers:
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    root_logger.setLevel(log_level)
+    
+    # Console handler (always present)
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(log_level)
+    console_handler.setFormatter(formatter)
+    root_logger.addHandler(console_handler)
+    
+    # File handler for debug logs (only when log level is DEBUG)
+    # The file is written by a background listener thread, so request paths
+    # only enqueue records
+    if DEBUG_ENABLED:
+        file_handler = logging.FileHandler('logs/debug.log')
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(formatter)
+        log_queue = queue.SimpleQueue()
+        log_listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        log_listener.start()
+        root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
 logger = logging.getLogger(__name__)
 
 # Log debug mode status immediately after configuration
-if log_level == logging.DEBUG:
+if DEBUG_ENABLED:
     logger.debug("DEBUG MODE: KME logging configured in debug mode")
     logger.debug(f"Debug logs will be written to: {os.path.abspath('logs/debug.log')}")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown."""
+    logger.info(f"Starting Easy-KME server on {settings.kme_host}:8000")
+    logger.info(f"KME ID: {settings.kme_id}")
+    check_openssl_acceleration()
+    
+    # Services live for the lifetime of the application
+    app.state.key_service = KeyService()
+    
+    # Log debug mode status
+    if DEBUG_ENABLED:
+        logger.debug("DEBUG MODE: KME is running in debug mode - detailed logging enabled")
+        logger.debug(f"Debug logs will be written to: {os.path.abspath('logs/debug.log')}")
+    
+    yield
+    
+    logger.info("Shutting down Easy-KME server")
+    
+    # Fold the key journal into the snapshot so the next start reads one file
+    app.state.key_service.storage_service.compact_keys()
+    # Wait for queued session/key pool snapshots to be written
+    app.state.key_service.storage_service.flush()
+    
+    # Flush queued debug log records to disk
+    if log_listener is not None:
+        log_listener.stop()
+
+
 # Create FastAPI application
 app = FastAPI(
     title="Easy-KME",
     description="ETSI GS QKD 014 Key Management Entity (KME) Server",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -73,76 +123,128 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add API logging middleware for debug mode
-@app.middleware("http")
+# Largest response body the debug middleware will log in full
+DEBUG_BODY_LOG_LIMIT = 64 * 1024
+
+
+def _log_response_body(response_body: bytes):
+    """Log a response body; run as a background task after the response is sent."""
+    if len(response_body) > DEBUG_BODY_LOG_LIMIT:
+        logger.debug(
+            "Response Body (first %d of %d bytes): %s",
+            DEBUG_BODY_LOG_LIMIT, len(response_body),
+            response_body[:DEBUG_BODY_LOG_LIMIT].decode('utf-8', errors='replace')
+        )
+        return
+    try:
+        json_response = orjson.loads(response_body)
+        logger.debug("Response Body (JSON): %s", orjson.dumps(json_response, option=orjson.OPT_INDENT_2).decode())
+    except orjson.JSONDecodeError:
+        logger.debug("Response Body (raw): %s", response_body.decode('utf-8', errors='replace'))
+
+
+# API logging middleware, registered only in debug mode
 async def log_api_requests(request: Request, call_next):
     """Log API requests and responses in debug mode."""
-    settings = get_settings()
+    # Log request details
+    logger.debug("=== API REQUEST ===")
+    logger.debug("Method: %s", request.method)
+    logger.debug("URL: %s", request.url)
+    logger.debug("Headers: %s", request.headers)
     
-    if settings.log_level == "DEBUG":
-        # Log request details
-        logger.debug(f"=== API REQUEST ===")
-        logger.debug(f"Method: {request.method}")
-        logger.debug(f"URL: {request.url}")
-        logger.debug(f"Headers: {dict(request.headers)}")
-        
-        # Process the request
-        response = await call_next(request)
-        
-        # Log response details
-        logger.debug(f"=== API RESPONSE ===")
-        logger.debug(f"Status Code: {response.status_code}")
-        logger.debug(f"Response Headers: {dict(response.headers)}")
+    # Process the request
+    response = await call_next(request)
+    
+    # Log response details
+    logger.debug("=== API RESPONSE ===")
+    logger.debug("Status Code: %s", response.status_code)
+    logger.debug("Response Headers: %s", response.headers)
+    
+    # Only buffer JSON bodies; anything else (e.g. NDJSON key streams) is
+    # passed through unbuffered
+    content_type = response.headers.get("content-type", "")
+    if content_type != "application/json":
+        logger.debug("Response Body: <%s, not logged>", content_type or "no content-type")
+        return response
+    
+    # Log response body once the response has been sent
+    try:
+        buf = bytearray()
+        async for chunk in response.body_iterator:
+            buf.extend(chunk)
+        response_body = bytes(buf)
         
-        # Log response body
-        try:
-            response_body = b""
-            async for chunk in response.body_iterator:
-                response_body += chunk
-            
-            # Try to parse as JSON
-            try:
-                import json
-                json_response = json.loads(response_body.decode('utf-8'))
-                logger.debug(f"Response Body (JSON): {json.dumps(json_response, indent=2)}")
-            except json.JSONDecodeError:
-                logger.debug(f"Response Body (raw): {response_body.decode('utf-8')}")
-            
-            # Create new response with the body
-            return Response(
-                content=response_body,
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.media_type
-            )
-        except Exception as e:
-            logger.debug(f"Error reading response body: {e}")
-            return response
-    else:
-        # Not in debug mode, just pass through
-        return await call_next(request)
+        # Create new response with the body
+        return Response(
+            content=response_body,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            media_type=response.media_type,
+            background=BackgroundTask(_log_response_body, response_body)
+        )
+    except Exception as e:
+        logger.debug("Error reading response body: %s", e)
+        return response
+
+
+if DEBUG_ENABLED:
+    app.middleware("http")(log_api_requests)
 
 # Include API routes
 app.include_router(router)
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Application startup event."""
-    settings = get_settings()
-    logger.info(f"Starting Easy-KME server on {settings.kme_host}:8000")
-    logger.info(f"KME ID: {settings.kme_id}")
-    
-    # Log debug mode status
-    if settings.log_level == "DEBUG":
-        logger.debug("DEBUG MODE: KME is running in debug mode - detailed logging enabled")
-        logger.debug(f"Debug logs will be written to: {os.path.abspath('logs/debug.log')}")
+def openapi() -> dict:
+    """OpenAPI schema, including the request bodies the KME routes parse themselves."""
+    if app.openapi_schema is None:
+        schemas = FastAPI.openapi(app).setdefault("components", {}).setdefault("schemas", {})
+        for name, schema in OPENAPI_SCHEMAS.items():
+            schemas.setdefault(name, schema)
+    return app.openapi_schema
 
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Application shutdown event."""
-    logger.info("Shutting down Easy-KME server")
+app.openapi = openapi
+
+
+# Field names accepted by the ETSI key request, reported when a request has extras
+KEY_REQUEST_FIELDS = tuple(KeyRequestSpec.model_fields)
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """Report non-ETSI request fields and invalid values as 400, per ETSI GS QKD 014."""
+    errors = exc.errors()
+    invalid_fields = [e["loc"][-1] for e in errors if e["type"] == "extra_forbidden"]
+    if invalid_fields and len(invalid_fields) == len(errors):
+        logger.warning("Invalid fields in request: %s", invalid_fields)
+        return ORJSONResponse(
+            status_code=400,
+            content={
+                "detail": f"ETSI GS QKD 014: Invalid fields detected: {invalid_fields}. "
+                          f"Valid fields are: {list(KEY_REQUEST_FIELDS)}"
+            }
+        )
+    # Errors raised by the request model validators carry the ETSI message
+    if all(e["type"] == "value_error" for e in errors):
+        detail = "; ".join(str(e["ctx"]["error"]) for e in errors)
+        logger.warning("Invalid request values: %s", detail)
+        return ORJSONResponse(status_code=400, content={"detail": detail})
+    return await request_validation_exception_handler(request, exc)
+
+
+def check_openssl_acceleration():
+    """Log the OpenSSL build used by cryptography and warn if CPU features are masked.
+
+    OpenSSL dispatches SHA-256 and AES to SHA-NI/AES-NI through EVP unless
+    OPENSSL_ia32cap clears those capability bits ("~" masks).
+    """
+    logger.info(f"Cryptography OpenSSL: {openssl_backend.openssl_version_text()}")
+    ia32cap = os.environ.get("OPENSSL_ia32cap", "")
+    if "~" in ia32cap:
+        logger.warning(
+            f"OPENSSL_ia32cap={ia32cap} masks CPU capabilities; "
+            "AES-NI/SHA-NI acceleration may be disabled"
+        )
 
 
 @app.get("/")
@@ -156,86 +258,161 @@ async def root():
     }
 
 
+# Fixed part of the /health response
+_HEALTH_BASE = {
+    "status": "healthy",
+    "server": "FastAPI with nginx mTLS termination",
+}
+
+# nginx headers read by /health (raw ASGI header names are lower-case)
+_HEALTH_HEADERS = frozenset({b"x-client-certificate", b"x-client-verified", b"x-client-dn"})
+
+
+def _get_headers(raw, names: frozenset) -> dict:
+    """Decode only the wanted headers in one pass over the raw header list.
+
+    The first occurrence of each header wins, as with Headers.get().
+    """
+    out = {}
+    for k, v in raw:
+        if k in names and k not in out:
+            out[k] = v
+    return {k.decode('latin-1'): v.decode('latin-1') for k, v in out.items()}
+
+
+# Name attributes reported by /health, keyed by OID
+_SUBJECT_OIDS = {
+    x509.NameOID.COMMON_NAME: "common_name",
+    x509.NameOID.ORGANIZATION_NAME: "organization",
+    x509.NameOID.ORGANIZATIONAL_UNIT_NAME: "organizational_unit",
+    x509.NameOID.COUNTRY_NAME: "country",
+    x509.NameOID.STATE_OR_PROVINCE_NAME: "state",
+    x509.NameOID.LOCALITY_NAME: "locality",
+}
+_ISSUER_OIDS = {
+    x509.NameOID.COMMON_NAME: "common_name",
+    x509.NameOID.ORGANIZATION_NAME: "organization",
+}
+
+
+def _name_to_dict(name: x509.Name, oids: dict) -> dict:
+    """Map the first value of each wanted attribute in one pass over the name."""
+    out = dict.fromkeys(oids.values())
+    for attr in name:
+        field = oids.get(attr.oid)
+        if field and out[field] is None:
+            out[field] = attr.value
+    return out
+
+
+# Parsed client certificates by SHA-256 of the DER; bounded and expiring so
+# clients rotating certificates cannot grow it without limit
+_CERT_CACHE = TTLCache(maxsize=1024, ttl=300.0)
+
+
+_PEM_BEGIN = "-----BEGIN CERTIFICATE-----"
+_PEM_END = "-----END CERTIFICATE-----"
+
+
+def _pem_to_der(pem: str) -> bytes:
+    """Decode the first certificate of a forwarded PEM (optionally URL-encoded) to DER.
+
+    The shipped nginx.conf does not forward X-Client-Certificate; proxies that
+    do may send a whole chain or pad the block, so only the first block is used.
+    """
+    if "%" in pem:
+        # nginx $ssl_client_escaped_cert
+        pem = unquote(pem)
+    start = pem.find(_PEM_BEGIN)
+    end = pem.find(_PEM_END, start)
+    if start < 0 or end < 0:
+        raise ValueError("No PEM certificate block in X-Client-Certificate")
+    return ssl.PEM_cert_to_DER_cert(pem[start:end + len(_PEM_END)])
+
+
+def _parse_cert_cached(der: bytes) -> dict:
+    """Parse a DER client certificate into its /health description.
+
+    nginx forwards the same certificate on every request of a connection, so
+    the parsed result is cached per certificate. The returned dict is shared
+    and must not be modified; per-request fields are added to a copy.
+    """
+    digest = hashlib.sha256(der).digest()
+    info = _CERT_CACHE.get(digest)
+    if info is None:
+        info = _parse_cert(der)
+        _CERT_CACHE.set(digest, info)
+    return info
+
+
+def _parse_cert(der: bytes) -> dict:
+    """Describe a client certificate for /health."""
+    cert = x509.load_der_x509_certificate(der)
+    return {
+        "subject": _name_to_dict(cert.subject, _SUBJECT_OIDS),
+        "issuer": _name_to_dict(cert.issuer, _ISSUER_OIDS),
+        "serial_number": str(cert.serial_number),
+        "not_valid_before": cert.not_valid_before_utc.isoformat(),
+        "not_valid_after": cert.not_valid_after_utc.isoformat(),
+        "signature_algorithm": cert.signature_algorithm_oid._name,
+        "public_key_algorithm": cert.public_key_algorithm_oid._name,
+        "version": cert.version.value,
+    }
+
+
 @app.get("/health")
 async def health_check(request: Request):
     """Health check endpoint with client certificate information."""
-    from cryptography import x509
-    from cryptography.hazmat.backends import default_backend
-    import base64
-    
-    settings = get_settings()
-    
     # Debug logging - show all headers
-    logger.info("=== Health Check Debug ===")
-    logger.info(f"All headers: {dict(request.headers)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("=== Health Check Debug ===")
+        logger.debug("All headers: %s", request.headers)
     
     # Initialize certificate info
-    cert_info = {
-        "status": "healthy",
-        "server": "FastAPI with nginx mTLS termination",
-        "client_certificate": None,
-        "debug": {
-            "all_headers": dict(request.headers),
-            "nginx_headers": {}
-        }
-    }
+    cert_info = dict(_HEALTH_BASE)
+    cert_info["client_certificate"] = None
     
     # Extract client certificate from nginx headers
-    client_cert_pem = request.headers.get("X-Client-Certificate")
-    client_verified = request.headers.get("X-Client-Verified")
-    client_dn = request.headers.get("X-Client-DN")
+    nginx_headers = _get_headers(request.headers.raw, _HEALTH_HEADERS)
+    client_cert_pem = nginx_headers.get("x-client-certificate")
+    client_verified = nginx_headers.get("x-client-verified")
+    client_dn = nginx_headers.get("x-client-dn")
+    cert_found = "FOUND" if client_cert_pem else "NOT FOUND"
     
     # Debug logging for nginx headers
-    logger.info(f"X-Client-Certificate: {'FOUND' if client_cert_pem else 'NOT FOUND'}")
-    logger.info(f"X-Client-Verified: {client_verified}")
-    logger.info(f"X-Client-DN: {client_dn}")
+    logger.info("X-Client-Certificate: %s", cert_found)
+    logger.info("X-Client-Verified: %s", client_verified)
+    logger.info("X-Client-DN: %s", client_dn)
     
-    # Store debug info
-    cert_info["debug"]["nginx_headers"] = {
-        "X-Client-Certificate": "FOUND" if client_cert_pem else "NOT FOUND",
-        "X-Client-Verified": client_verified,
-        "X-Client-DN": client_dn
-    }
+    # Include request headers in the response only in debug mode
+    if DEBUG_ENABLED:
+        cert_info["debug"] = {
+            "all_headers": dict(request.headers),
+            "nginx_headers": {
+                "X-Client-Certificate": cert_found,
+                "X-Client-Verified": client_verified,
+                "X-Client-DN": client_dn
+            }
+        }
     
     if client_cert_pem:
         logger.info("Certificate found in nginx headers, parsing...")
         try:
-            # Parse the certificate
-            cert = x509.load_pem_x509_certificate(
-                client_cert_pem.encode('utf-8'), 
-                default_backend()
-            )
+            # Parse the certificate (cached per PEM) and extract salient characteristics
+            parsed = _parse_cert_cached(_pem_to_der(client_cert_pem))
             
             logger.info("Certificate parsed successfully")
             
-            # Extract salient characteristics
             cert_info["client_certificate"] = {
-                "subject": {
-                    "common_name": cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)[0].value if cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME) else None,
-                    "organization": cert.subject.get_attributes_for_oid(x509.NameOID.ORGANIZATION_NAME)[0].value if cert.subject.get_attributes_for_oid(x509.NameOID.ORGANIZATION_NAME) else None,
-                    "organizational_unit": cert.subject.get_attributes_for_oid(x509.NameOID.ORGANIZATIONAL_UNIT_NAME)[0].value if cert.subject.get_attributes_for_oid(x509.NameOID.ORGANIZATIONAL_UNIT_NAME) else None,
-                    "country": cert.subject.get_attributes_for_oid(x509.NameOID.COUNTRY_NAME)[0].value if cert.subject.get_attributes_for_oid(x509.NameOID.COUNTRY_NAME) else None,
-                    "state": cert.subject.get_attributes_for_oid(x509.NameOID.STATE_OR_PROVINCE_NAME)[0].value if cert.subject.get_attributes_for_oid(x509.NameOID.STATE_OR_PROVINCE_NAME) else None,
-                    "locality": cert.subject.get_attributes_for_oid(x509.NameOID.LOCALITY_NAME)[0].value if cert.subject.get_attributes_for_oid(x509.NameOID.LOCALITY_NAME) else None,
-                },
-                "issuer": {
-                    "common_name": cert.issuer.get_attributes_for_oid(x509.NameOID.COMMON_NAME)[0].value if cert.issuer.get_attributes_for_oid(x509.NameOID.COMMON_NAME) else None,
-                    "organization": cert.issuer.get_attributes_for_oid(x509.NameOID.ORGANIZATION_NAME)[0].value if cert.issuer.get_attributes_for_oid(x509.NameOID.ORGANIZATION_NAME) else None,
-                },
-                "serial_number": str(cert.serial_number),
-                "not_valid_before": cert.not_valid_before.isoformat(),
-                "not_valid_after": cert.not_valid_after.isoformat(),
-                "signature_algorithm": cert.signature_algorithm_oid._name,
-                "public_key_algorithm": cert.public_key_algorithm._name,
-                "version": cert.version.value,
+                **parsed,
                 "nginx_verified": client_verified,
                 "nginx_dn": client_dn
             }
             
-            logger.info(f"Certificate subject: {cert_info['client_certificate']['subject']}")
+            logger.info("Certificate subject: %s", parsed["subject"])
             
         except Exception as e:
-            logger.error(f"Failed to parse certificate: {e}")
+            logger.error("Failed to parse certificate: %s", e)
             cert_info["client_certificate"] = {
                 "error": f"Failed to parse certificate: {str(e)}",
                 "raw_pem": client_cert_pem[:100] + "..." if len(client_cert_pem) > 100 else client_cert_pem
@@ -248,21 +425,25 @@ async def health_check(request: Request):
             "nginx_dn": client_dn
         }
     
-    logger.info("=== End Health Check Debug ===")
+    logger.debug("=== End Health Check Debug ===")
     return cert_info
 
 
 def run_server():
     """Run the KME server with HTTP (nginx handles SSL)."""
-    settings = get_settings()
-    
     logger.info("Starting Easy-KME server with HTTP (nginx handles mTLS)...")
     
-    # Run with uvicorn on HTTP (nginx handles SSL)
+    # Run with uvicorn on HTTP (nginx handles SSL).
+    # uvloop/httptools come with uvicorn[standard]; "auto" falls back to
+    # asyncio/h11 where they are unavailable. Keep-alive outlasts nginx's
+    # upstream keepalive_timeout (60s) so pooled connections are not reset.
     uvicorn.run(
         app,
         host=settings.kme_host,
         port=8000,  # Fixed port for nginx upstream
+        loop="auto",
+        http="auto",
+        timeout_keep_alive=75,
         log_level="info"
     )
 
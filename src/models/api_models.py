@@ -3,9 +3,34 @@ API request and response models for ETSI GS QKD 014 KME server.
 """
 
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from datetime import datetime
 
+from ..config import get_settings
+
+
+def _check_number_limit(v: Optional[int]) -> Optional[int]:
+    limit = get_settings().max_key_per_request
+    if v is not None and v > limit:
+        raise ValueError(f"ETSI GS QKD 014: 'number' exceeds max_key_per_request ({limit})")
+    return v
+
+
+def _check_size_bounds(v: Optional[int]) -> Optional[int]:
+    settings = get_settings()
+    if v is not None and not settings.key_min_size <= v <= settings.key_max_size:
+        raise ValueError(
+            f"ETSI GS QKD 014: 'size' must be between {settings.key_min_size} and {settings.key_max_size}"
+        )
+    return v
+
+
+def _check_sae_id_count(v: Optional[List[str]]) -> Optional[List[str]]:
+    limit = get_settings().max_sae_id_count
+    if v and len(v) > limit:
+        raise ValueError(f"ETSI GS QKD 014: additional_slave_SAE_IDs exceeds max_SAE_ID_count ({limit})")
+    return v
+
 
 class KeyRequest(BaseModel):
     """Internal key request model (snake_case)."""
@@ -13,15 +38,64 @@ class KeyRequest(BaseModel):
     size: Optional[int] = Field(default=256, ge=8, description="Key size in bits")
     additional_slave_sae_ids: Optional[List[str]] = Field(default=None)
 
+    @field_validator('number')
+    @classmethod
+    def check_number(cls, v: Optional[int]) -> Optional[int]:
+        return _check_number_limit(v)
+
+    @field_validator('size')
+    @classmethod
+    def check_size(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v % 8:
+            raise ValueError("size shall be a multiple of 8")
+        return _check_size_bounds(v)
+
+    @field_validator('additional_slave_sae_ids')
+    @classmethod
+    def check_additional_slave_sae_ids(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        return _check_sae_id_count(v)
+
 
 class KeyRequestSpec(BaseModel):
     """ETSI 014 Key request model (field names per spec)."""
+    model_config = ConfigDict(extra='forbid')
+
     number: Optional[int] = Field(default=None)
     size: Optional[int] = Field(default=None)
     additional_slave_SAE_IDs: Optional[List[str]] = Field(default=None)
     extension_mandatory: Optional[List[dict]] = Field(default=None)
     extension_optional: Optional[List[dict]] = Field(default=None)
 
+    @field_validator('number')
+    @classmethod
+    def check_number(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("ETSI GS QKD 014: 'number' must be >= 1")
+        return _check_number_limit(v)
+
+    @field_validator('size')
+    @classmethod
+    def check_size(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None:
+            if v < 8:
+                raise ValueError("ETSI GS QKD 014: 'size' must be >= 8")
+            if v % 8:
+                raise ValueError("size shall be a multiple of 8")
+        return _check_size_bounds(v)
+
+    @field_validator('additional_slave_SAE_IDs')
+    @classmethod
+    def check_additional_slave_sae_ids(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        return _check_sae_id_count(v)
+
+    @field_validator('extension_mandatory')
+    @classmethod
+    def check_extension_mandatory(cls, v: Optional[List[dict]]) -> Optional[List[dict]]:
+        # No mandatory extensions are supported
+        if v:
+            raise ValueError("not all extension_mandatory parameters are supported")
+        return v
+
 
 class Key(BaseModel):
     """Internal individual key model."""
@@ -37,7 +111,7 @@ class CertificateExtension(BaseModel):
     client_issuer: str = Field(..., description="Certificate issuer Distinguished Name")
     ssl_protocol: str = Field(..., description="SSL/TLS protocol version used")
     ssl_cipher: str = Field(..., description="SSL/TLS cipher suite used")
-    timestamp: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of the request")
+    timestamp: datetime = Field(..., description="Timestamp of the request")
     sae_id: str = Field(..., description="Extracted SAE ID from certificate DN")
 
 
@@ -6,6 +6,8 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime
 from pydantic import BaseModel, Field
 
+from ..utils.timeutils import utcnow_cached
+
 
 class Key(BaseModel):
     """Internal key storage model."""
@@ -13,7 +15,7 @@ class Key(BaseModel):
     key_id: str = Field(..., description="Unique key identifier")
     key_material: str = Field(..., description="Base64 encoded key material")
     key_size: int = Field(..., description="Key size in bits")
-    created_at: datetime = Field(default_factory=datetime.utcnow, description="Key creation timestamp")
+    created_at: datetime = Field(default_factory=utcnow_cached, description="Key creation timestamp")
     expires_at: Optional[datetime] = Field(default=None, description="Key expiration timestamp")
     is_used: bool = Field(default=False, description="Whether key has been used")
     master_sae_id: Optional[str] = Field(default=None, description="Master SAE ID that requested this key")
@@ -27,7 +29,7 @@ class Session(BaseModel):
     master_sae_id: str = Field(..., description="Master SAE ID")
     slave_sae_ids: List[str] = Field(..., description="Slave SAE IDs")
     key_ids: List[str] = Field(..., description="Key IDs in this session")
-    created_at: datetime = Field(default_factory=datetime.utcnow, description="Session creation timestamp")
+    created_at: datetime = Field(default_factory=utcnow_cached, description="Session creation timestamp")
     expires_at: Optional[datetime] = Field(default=None, description="Session expiration timestamp")
     is_active: bool = Field(default=True, description="Whether session is active")
 
@@ -38,7 +40,7 @@ class SAERegistry(BaseModel):
     sae_id: str = Field(..., description="SAE identifier")
     certificate_subject: str = Field(..., description="Certificate subject DN")
     certificate_serial: str = Field(..., description="Certificate serial number")
-    registered_at: datetime = Field(default_factory=datetime.utcnow, description="Registration timestamp")
+    registered_at: datetime = Field(default_factory=utcnow_cached, description="Registration timestamp")
     is_active: bool = Field(default=True, description="Whether SAE is active")
     last_seen: Optional[datetime] = Field(default=None, description="Last activity timestamp")
 
@@ -60,4 +62,4 @@ class StorageData(BaseModel):
     sessions: List[Session] = Field(default_factory=list, description="Active sessions")
     sae_registry: List[SAERegistry] = Field(default_factory=list, description="Registered SAEs")
     key_pool: KeyPool = Field(..., description="Key pool status")
-    last_updated: datetime = Field(default_factory=datetime.utcnow, description="Last storage update") 
+    last_updated: datetime = Field(default_factory=utcnow_cached, description="Last storage update") 
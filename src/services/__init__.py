@@ -2,12 +2,13 @@
 Services for Easy-KME server.
 """
 
-from .storage_service import StorageService
+from .storage_service import StorageService, get_storage_service
 from .key_service import KeyService
 from .auth_service import AuthService
 
 __all__ = [
     "StorageService",
+    "get_storage_service",
     "KeyService", 
     "AuthService"
 ] 
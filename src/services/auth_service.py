@@ -3,45 +3,84 @@ Authentication service for Easy-KME server.
 Handles certificate-based authentication and SAE ID extraction.
 """
 
-import ssl
+import hashlib
+from functools import cached_property
 from typing import Optional, Tuple
 from cryptography import x509
-from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
+from cryptography.hazmat.primitives.asymmetric import padding, ec, ed25519
 import logging
-from datetime import datetime
 
 from ..config import get_settings
 from ..models.data_models import SAERegistry
-from .storage_service import StorageService
+from ..utils.timeutils import utcnow_cached
+from .storage_service import get_storage_service
+from .lookup_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Subject attributes checked for the SAE ID, resolved once at import
+_CN = x509.NameOID.COMMON_NAME
+_OU = x509.NameOID.ORGANIZATIONAL_UNIT_NAME
+
+# Signature parameters reused across verifications; SHA-256 is the common case
+_PKCS1V15 = padding.PKCS1v15()
+_SHA256 = hashes.SHA256()
+_ECDSA_SHA256 = ec.ECDSA(_SHA256)
+
+
+def _hash_algorithm(cert: x509.Certificate) -> hashes.HashAlgorithm:
+    algorithm = cert.signature_hash_algorithm
+    return _SHA256 if isinstance(algorithm, hashes.SHA256) else algorithm
+
 
 class AuthService:
     """Certificate-based authentication service."""
     
     def __init__(self):
         self.settings = get_settings()
-        self.storage_service = StorageService()
+        self.storage_service = get_storage_service()
+        # Per-certificate results, keyed by SHA-256 of the DER bytes
+        self._verified_certs = TTLCache(maxsize=1024, ttl=self.settings.cert_cache_ttl)
+        self._cert_sae_ids = TTLCache(maxsize=1024, ttl=self.settings.cert_cache_ttl)
+    
+    @cached_property
+    def ca_cert(self) -> x509.Certificate:
+        """CA certificate, loaded from disk once per service instance."""
+        with open(self.settings.ca_cert_path, 'rb') as f:
+            return x509.load_pem_x509_certificate(f.read())
+    
+    @cached_property
+    def ca_public_key(self):
+        """CA public key, built once from the cached CA certificate."""
+        return self.ca_cert.public_key()
     
     def extract_sae_id_from_cert(self, client_cert: bytes) -> Optional[str]:
         """Extract SAE ID from client certificate."""
+        digest = hashlib.sha256(client_cert).digest()
+        sae_id = self._cert_sae_ids.get(digest)
+        if sae_id is not None:
+            return sae_id
+        sae_id = self._extract_sae_id(client_cert)
+        if sae_id:
+            self._cert_sae_ids.set(digest, sae_id)
+        return sae_id
+    
+    def _extract_sae_id(self, client_cert: bytes) -> Optional[str]:
         try:
             # Parse the certificate
-            cert = x509.load_der_x509_certificate(client_cert, default_backend())
+            cert = x509.load_der_x509_certificate(client_cert)
             
             # Extract SAE ID from subject DN
             # Common Name (CN) is typically used for SAE ID
             sae_id = None
-            for name in cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME):
+            for name in cert.subject.get_attributes_for_oid(_CN):
                 sae_id = name.value
                 break
             
             if not sae_id:
                 # Try alternative fields if CN is not available
-                for name in cert.subject.get_attributes_for_oid(x509.NameOID.ORGANIZATIONAL_UNIT_NAME):
+                for name in cert.subject.get_attributes_for_oid(_OU):
                     sae_id = name.value
                     break
             
@@ -52,25 +91,45 @@ class AuthService:
             return None
     
     def verify_client_certificate(self, client_cert: bytes) -> bool:
-        """Verify client certificate against CA."""
+        """Verify client certificate against CA.
+
+        Results are cached per certificate for ``cert_cache_ttl`` seconds.
+        """
+        digest = hashlib.sha256(client_cert).digest()
+        verified = self._verified_certs.get(digest)
+        if verified is None:
+            verified = self._verify_signature(client_cert)
+            self._verified_certs.set(digest, verified)
+        return verified
+    
+    def _verify_signature(self, client_cert: bytes) -> bool:
         try:
-            # Load CA certificate
-            with open(self.settings.ca_cert_path, 'rb') as f:
-                ca_cert_data = f.read()
-            
-            ca_cert = x509.load_pem_x509_certificate(ca_cert_data, default_backend())
+            # CA public key is built once and reused across verifications
+            ca_public_key = self.ca_public_key
             
             # Load client certificate
-            client_cert_obj = x509.load_der_x509_certificate(client_cert, default_backend())
-            
-            # Verify certificate chain
-            ca_public_key = ca_cert.public_key()
-            ca_public_key.verify(
-                client_cert_obj.signature,
-                client_cert_obj.tbs_certificate_bytes,
-                padding.PKCS1v15(),
-                client_cert_obj.signature_hash_algorithm
-            )
+            client_cert_obj = x509.load_der_x509_certificate(client_cert)
+            
+            # Verify certificate chain (RSA, ECDSA or Ed25519 CA keys)
+            if isinstance(ca_public_key, ec.EllipticCurvePublicKey):
+                algorithm = _hash_algorithm(client_cert_obj)
+                ca_public_key.verify(
+                    client_cert_obj.signature,
+                    client_cert_obj.tbs_certificate_bytes,
+                    _ECDSA_SHA256 if algorithm is _SHA256 else ec.ECDSA(algorithm)
+                )
+            elif isinstance(ca_public_key, ed25519.Ed25519PublicKey):
+                ca_public_key.verify(
+                    client_cert_obj.signature,
+                    client_cert_obj.tbs_certificate_bytes
+                )
+            else:
+                ca_public_key.verify(
+                    client_cert_obj.signature,
+                    client_cert_obj.tbs_certificate_bytes,
+                    _PKCS1V15,
+                    _hash_algorithm(client_cert_obj)
+                )
             
             return True
             
@@ -81,38 +140,32 @@ class AuthService:
     def register_sae(self, sae_id: str, client_cert: bytes) -> bool:
         """Register a new SAE or update existing registration."""
         try:
-            cert = x509.load_der_x509_certificate(client_cert, default_backend())
+            cert = x509.load_der_x509_certificate(client_cert)
             
             # Extract certificate details
             subject = str(cert.subject)
             serial = str(cert.serial_number)
             
-            # Get existing SAE registry
-            sae_registry = self.storage_service.get_sae_registry()
-            
             # Check if SAE already exists
-            existing_sae = None
-            for sae in sae_registry:
-                if sae.sae_id == sae_id:
-                    existing_sae = sae
-                    break
+            existing_sae = self.storage_service.get_sae(sae_id)
             
             if existing_sae:
                 # Update existing SAE
-                existing_sae.certificate_subject = subject
-                existing_sae.certificate_serial = serial
-                existing_sae.last_seen = datetime.utcnow()
+                sae = existing_sae.model_copy(update={
+                    "certificate_subject": subject,
+                    "certificate_serial": serial,
+                    "last_seen": utcnow_cached(),
+                })
             else:
                 # Create new SAE registration
-                new_sae = SAERegistry(
+                sae = SAERegistry(
                     sae_id=sae_id,
                     certificate_subject=subject,
                     certificate_serial=serial
                 )
-                sae_registry.append(new_sae)
             
             # Save updated registry
-            self.storage_service.save_sae_registry(sae_registry)
+            self.storage_service.upsert_sae(sae)
             logger.info(f"SAE {sae_id} registered/updated successfully")
             return True
             
@@ -148,12 +201,9 @@ class AuthService:
     def is_sae_authorized(self, sae_id: str, key_ids: list) -> bool:
         """Check if SAE is authorized to access specific keys."""
         try:
-            keys = self.storage_service.get_keys()
-            sessions = self.storage_service.get_sessions()
-            
             # Check if SAE is authorized for any of the requested keys
             for key_id in key_ids:
-                key = next((k for k in keys if k.key_id == key_id), None)
+                key = self.storage_service.get_key(key_id)
                 if not key:
                     logger.warning(f"Key {key_id} not found")
                     return False
@@ -171,34 +221,3 @@ class AuthService:
         except Exception as e:
             logger.error(f"Error checking SAE authorization: {e}")
             return False 
-
-    def is_slave_authorized_for_keys(self, slave_sae_id: str, key_ids: list, master_sae_id: str) -> bool:
-        """Check slave-only authorization for dec_keys per ETSI GS QKD 014.
-
-        The requester must be a slave SAE listed on the corresponding keys, and
-        the provided master_sae_id must match the key's master.
-        """
-        try:
-            keys = self.storage_service.get_keys()
-
-            for key_id in key_ids:
-                key = next((k for k in keys if k.key_id == key_id), None)
-                if not key:
-                    logger.warning(f"Key {key_id} not found")
-                    return False
-
-                if key.master_sae_id != master_sae_id:
-                    logger.warning(
-                        f"Key {key_id} master mismatch: expected {master_sae_id}, got {key.master_sae_id}"
-                    )
-                    return False
-
-                if slave_sae_id not in key.slave_sae_ids:
-                    logger.warning(f"Slave SAE {slave_sae_id} not authorized for key {key_id}")
-                    return False
-
-            return True
-
-        except Exception as e:
-            logger.error(f"Error checking slave authorization: {e}")
-            return False
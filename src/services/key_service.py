@@ -3,56 +3,87 @@ Key service for Easy-KME server.
 Handles key generation, management, and distribution.
 """
 
-import secrets
+import os
 import base64
+import threading
 import uuid
 from typing import List, Optional, Tuple
-from datetime import datetime, timedelta
 import logging
 
+from pydantic import TypeAdapter
+
 from ..config import get_settings
-from ..models.data_models import Key, Session, KeyPool
+from ..models.data_models import Key, Session
 from ..models.api_models import KeyRequest, KeyContainer, Key as APIKey
-from .storage_service import StorageService
+from ..utils.timeutils import utcnow_cached
+from .storage_service import get_storage_service
+from .lookup_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Builds API key lists straight from stored key objects in one validation call
+_API_KEYS_ADAPTER = TypeAdapter(List[APIKey])
+
+
+def _new_id() -> str:
+    """Random ID for internal records (undashed UUID4 hex)."""
+    return uuid.uuid4().hex
+
+
+def _uuid4_strings(number: int) -> List[str]:
+    """Canonical (dashed) random UUID4 strings, from one urandom read.
+
+    ETSI GS QKD 014 key_IDs are UUIDs, so key IDs keep the dashed form.
+    """
+    buf = bytearray(os.urandom(16 * number))
+    for offset in range(0, 16 * number, 16):
+        buf[offset + 6] = buf[offset + 6] & 0x0F | 0x40  # version 4
+        buf[offset + 8] = buf[offset + 8] & 0x3F | 0x80  # RFC 4122 variant
+    h = buf.hex()
+    return [
+        f"{h[i:i + 8]}-{h[i + 8:i + 12]}-{h[i + 12:i + 16]}-{h[i + 16:i + 20]}-{h[i + 20:i + 32]}"
+        for i in range(0, 32 * number, 32)
+    ]
+
 
 class KeyService:
     """Key management service for KME operations."""
     
     def __init__(self):
         self.settings = get_settings()
-        self.storage_service = StorageService()
-    
-    def generate_key(self, key_size: int = 256) -> Tuple[str, str]:
-        """Generate a cryptographically secure random key."""
-        # Generate random bytes
-        key_bytes = secrets.token_bytes(key_size // 8)
-        
-        # Generate unique key ID
-        key_id = str(uuid.uuid4())
-        
-        # Encode key material as base64
-        key_material = base64.b64encode(key_bytes).decode('utf-8')
-        
-        return key_id, key_material
+        self.storage_service = get_storage_service()
+        # Serializes key pool read-modify-write cycles across worker threads
+        self._lock = threading.RLock()
+        # Latest status payload, keyed on the storage generation it was built from
+        self._status_cache = TTLCache(maxsize=1, ttl=60.0)
     
     def generate_keys(self, number: int, key_size: int) -> List[Key]:
         """Generate multiple keys."""
-        keys = []
-        for _ in range(number):
-            key_id, key_material = self.generate_key(key_size)
-            key = Key(
+        # One CSPRNG read for the whole batch, sliced into per-key material
+        step = key_size // 8
+        buf = os.urandom(number * step)
+        b64encode = base64.b64encode
+        key_ids = _uuid4_strings(number)
+        # One timestamp shared by the whole batch (datetimes are immutable)
+        now = utcnow_cached()
+        # Generated values are well-formed; skip pydantic validation
+        return [
+            Key.model_construct(
                 key_id=key_id,
-                key_material=key_material,
-                key_size=key_size
+                key_material=b64encode(buf[offset:offset + step]).decode('ascii'),
+                key_size=key_size,
+                created_at=now
             )
-            keys.append(key)
-        return keys
+            for key_id, offset in zip(key_ids, range(0, number * step, step))
+        ]
     
     def refill_key_pool(self) -> bool:
         """Refill the key pool if it's below threshold."""
+        with self._lock:
+            return self._refill_key_pool()
+    
+    def _refill_key_pool(self) -> bool:
+        """Refill the key pool (runs under ``self._lock``)."""
         try:
             key_pool = self.storage_service.get_key_pool()
             
@@ -65,18 +96,12 @@ class KeyService:
             # Generate new keys
             new_keys = self.generate_keys(keys_to_generate, key_pool.key_size)
             
-            # Get existing keys
-            existing_keys = self.storage_service.get_keys()
-            
-            # Add new keys
-            all_keys = existing_keys + new_keys
-            
-            # Update key pool
-            key_pool.current_size = len(all_keys)
-            key_pool.last_refill = datetime.utcnow()
+            # Update key pool (existing keys counted from the in-memory index)
+            key_pool.current_size = self.storage_service.key_count() + len(new_keys)
+            key_pool.last_refill = utcnow_cached()
             
-            # Save to storage
-            self.storage_service.save_keys(all_keys)
+            # Journal the new keys rather than rewriting the whole key file
+            self.storage_service.add_keys(new_keys)
             self.storage_service.update_key_pool(key_pool)
             
             logger.info(f"Refilled key pool with {len(new_keys)} keys")
@@ -90,68 +115,42 @@ class KeyService:
                                 key_request: KeyRequest) -> Optional[KeyContainer]:
         """Get keys for master SAE (Get key API)."""
         try:
-            # Validate request (lab: strict input acceptance per ETSI simple rules)
-            if key_request.size is not None and key_request.size % 8 != 0:
-                logger.error("size shall be a multiple of 8")
-                return None
-            if key_request.number is not None and key_request.number > self.settings.max_key_per_request:
-                logger.error("number exceeds max_key_per_request")
-                return None
-            if key_request.size is not None and (key_request.size < self.settings.key_min_size or key_request.size > self.settings.key_max_size):
-                logger.error("size outside allowed bounds")
-                return None
-            if key_request.additional_slave_sae_ids and len(key_request.additional_slave_sae_ids) > self.settings.max_sae_id_count:
-                logger.error("additional_slave_SAE_IDs exceeds max_SAE_ID_count")
-                return None
-
-            # Ensure key pool is sufficiently full
-            self.refill_key_pool()
-            
-            # Get available keys
-            all_keys = self.storage_service.get_keys()
-            available_keys = [k for k in all_keys if not k.is_used and not k.master_sae_id]
-            
-            if len(available_keys) < key_request.number:
-                logger.error(f"Insufficient keys available. Requested: {key_request.number}, Available: {len(available_keys)}")
-                return None
-            
-            # Select keys for this request
-            selected_keys = available_keys[: key_request.number or 1]
-            
-            # Mark keys as used and assign to master SAE
-            for key in selected_keys:
-                key.is_used = True
-                key.master_sae_id = master_sae_id
-                key.slave_sae_ids = [slave_sae_id]
+            # Limits are enforced by the KeyRequest / KeyRequestSpec validators
+            with self._lock:
+                # Ensure key pool is sufficiently full
+                self.refill_key_pool()
                 
-                # Add additional slave SAEs if specified
-                if key_request.additional_slave_sae_ids:
-                    key.slave_sae_ids.extend(key_request.additional_slave_sae_ids)
-            
-            # Create session
-            session = Session(
-                session_id=str(uuid.uuid4()),
-                master_sae_id=master_sae_id,
-                slave_sae_ids=[slave_sae_id] + (key_request.additional_slave_sae_ids or []),
-                key_ids=[k.key_id for k in selected_keys]
-            )
-            
-            # Save updated data
-            self.storage_service.save_keys(all_keys)
-            
-            sessions = self.storage_service.get_sessions()
-            sessions.append(session)
-            self.storage_service.save_sessions(sessions)
+                # Select keys for this request
+                number = key_request.number or 1
+                selected_keys = self.storage_service.take_available_keys(number)
+                
+                if selected_keys is None:
+                    logger.error(f"Insufficient keys available. Requested: {number}")
+                    return None
+                
+                # Mark keys as used and assign to master SAE
+                for key in selected_keys:
+                    key.is_used = True
+                    key.master_sae_id = master_sae_id
+                    key.slave_sae_ids = [slave_sae_id]
+                
+                    # Add additional slave SAEs if specified
+                    if key_request.additional_slave_sae_ids:
+                        key.slave_sae_ids.extend(key_request.additional_slave_sae_ids)
+                
+                # Create session
+                session = Session(
+                    session_id=_new_id(),
+                    master_sae_id=master_sae_id,
+                    slave_sae_ids=[slave_sae_id] + (key_request.additional_slave_sae_ids or []),
+                    key_ids=[k.key_id for k in selected_keys]
+                )
+                
+                # Journal the allocated keys and their session in one write
+                self.storage_service.atomic_update(keys=selected_keys, sessions_append=[session])
             
             # Create API response
-            api_keys = [
-                APIKey(
-                    key_id=key.key_id,
-                    key_material=key.key_material,
-                    key_size=key.key_size
-                )
-                for key in selected_keys
-            ]
+            api_keys = _API_KEYS_ADAPTER.validate_python(selected_keys, from_attributes=True)
             
             key_container = KeyContainer(
                 keys=api_keys,
@@ -166,78 +165,71 @@ class KeyService:
             logger.error(f"Error getting keys for master SAE {master_sae_id}: {e}")
             return None
     
-    def get_keys_for_slave_sae(self, slave_sae_id: str, master_sae_id: str, 
-                               key_ids: List[str]) -> Optional[KeyContainer]:
-        """Get keys for slave SAE (Get key with key IDs API)."""
-        try:
-            # Get all keys
-            all_keys = self.storage_service.get_keys()
-            
-            # Find requested keys
-            requested_keys = []
-            for key_id in key_ids:
-                key = next((k for k in all_keys if k.key_id == key_id), None)
-                if not key:
-                    logger.error(f"Key {key_id} not found")
-                    return None
-                
-                # Verify slave SAE is authorized
-                if slave_sae_id not in key.slave_sae_ids:
-                    logger.error(f"Slave SAE {slave_sae_id} not authorized for key {key_id}")
-                    return None
-                
-                # Verify master SAE matches
-                if key.master_sae_id != master_sae_id:
-                    logger.error(f"Key {key_id} does not belong to master SAE {master_sae_id}")
-                    return None
-                
-                requested_keys.append(key)
-            
-            # Create API response
-            api_keys = [
-                APIKey(
-                    key_id=key.key_id,
-                    key_material=key.key_material,
-                    key_size=key.key_size
+    def fetch_and_authorize(self, slave_sae_id: str, master_sae_id: str,
+                            key_ids: List[str]) -> Tuple[bool, Optional[KeyContainer]]:
+        """Authorize a slave SAE for key IDs and fetch them in one storage pass.
+
+        Returns ``(False, None)`` if any key is missing, belongs to another
+        master SAE, or does not list the slave SAE; otherwise ``(True, container)``.
+        """
+        requested_keys = []
+        for key_id in key_ids:
+            key = self.storage_service.get_key(key_id)
+            if not key:
+                logger.warning(f"Key {key_id} not found")
+                return False, None
+            
+            # Verify master SAE matches
+            if key.master_sae_id != master_sae_id:
+                logger.warning(
+                    f"Key {key_id} master mismatch: expected {master_sae_id}, got {key.master_sae_id}"
                 )
-                for key in requested_keys
-            ]
+                return False, None
             
-            key_container = KeyContainer(
-                keys=api_keys,
-                key_number=len(api_keys),
-                key_size=requested_keys[0].key_size if requested_keys else 256
-            )
+            # Verify slave SAE is authorized
+            if slave_sae_id not in key.slave_sae_ids:
+                logger.warning(f"Slave SAE {slave_sae_id} not authorized for key {key_id}")
+                return False, None
             
-            logger.info(f"Retrieved {len(requested_keys)} keys for slave SAE {slave_sae_id}")
-            return key_container
-            
-        except Exception as e:
-            logger.error(f"Error getting keys for slave SAE {slave_sae_id}: {e}")
-            return None
+            requested_keys.append(key)
+        
+        # Create API response
+        api_keys = _API_KEYS_ADAPTER.validate_python(requested_keys, from_attributes=True)
+        
+        key_container = KeyContainer(
+            keys=api_keys,
+            key_number=len(api_keys),
+            key_size=requested_keys[0].key_size if requested_keys else 256
+        )
+        
+        logger.info(f"Retrieved {len(requested_keys)} keys for slave SAE {slave_sae_id}")
+        return True, key_container
     
     def get_status(self, master_sae_id: str | None = None, slave_sae_id: str | None = None) -> dict:
         """Get KME status information.
 
-        Parameters are placeholders to align with ETSI 'Get status' semantics.
+        Parameters are placeholders to align with ETSI 'Get status' semantics;
+        the payload is the same for every SAE pair. It is cached until the
+        next storage write (key, session, key pool or SAE registry).
         """
+        cache_key = self.storage_service.generation
+        cached = self._status_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
         try:
             key_pool = self.storage_service.get_key_pool()
-            keys = self.storage_service.get_keys()
-            sessions = self.storage_service.get_sessions()
-            sae_registry = self.storage_service.get_sae_registry()
             
-            return {
+            status = {
                 "status": "operational",
                 "kme_id": self.settings.kme_id,
                 "version": "1.0.0",
                 "key_pool_size": key_pool.current_size,
                 "max_key_pool_size": key_pool.max_size,
-                "active_sessions": len([s for s in sessions if s.is_active]),
-                "registered_saes": len([s for s in sae_registry if s.is_active]),
-                "total_keys": len(keys),
-                "available_keys": len([k for k in keys if not k.is_used])
+                **self.storage_service.stats()
             }
+            self._status_cache.set(cache_key, status)
+            return dict(status)
             
         except Exception as e:
             logger.error(f"Error getting status: {e}")
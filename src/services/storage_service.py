@@ -2,33 +2,145 @@
 File-based storage service for Easy-KME server.
 """
 
-import json
 import os
+import threading
+from collections import deque
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import logging
 
+import orjson
+
 from ..models.data_models import StorageData, Key, Session, SAERegistry, KeyPool
 from ..config import get_settings
 
 logger = logging.getLogger(__name__)
 
+def _dumps(data: Any) -> bytes:
+    """Serialize storage data; naive datetimes are written as UTC."""
+    return orjson.dumps(data, default=str, option=orjson.OPT_NAIVE_UTC)
+
+
+# Datetime fields per stored model, parsed by hand when skipping validation
+_DATETIME_FIELDS = {
+    Key: ("created_at", "expires_at"),
+    Session: ("created_at", "expires_at"),
+    SAERegistry: ("registered_at", "last_seen"),
+    KeyPool: ("last_refill",),
+}
+
+
+def _is_available(key: Key) -> bool:
+    """True if the key has not been handed out to a master SAE."""
+    return not key.is_used and not key.master_sae_id
+
+
+# Key journal size at which it is folded back into the keys.json snapshot
+KEY_JOURNAL_COMPACT_BYTES = 10 * 1024 * 1024
+
+
+class _BackgroundWriter:
+    """Writes file snapshots off the request path, latest snapshot per file wins."""
+    
+    def __init__(self, write):
+        self._write = write
+        self._pending: Dict[Path, bytes] = {}
+        # Batch being written; still served to readers until it is on disk
+        self._writing: Dict[Path, bytes] = {}
+        # Snapshots whose write failed, retried with the next batch or at flush()
+        self._failed: Dict[Path, bytes] = {}
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+    
+    def submit(self, path: Path, data: bytes):
+        with self._cond:
+            self._pending[path] = data
+            self._cond.notify_all()
+    
+    def pending(self, path: Path) -> Optional[bytes]:
+        """Bytes queued for ``path`` but not yet written, if any."""
+        with self._cond:
+            for queue in (self._pending, self._writing, self._failed):
+                data = queue.get(path)
+                if data is not None:
+                    return data
+            return None
+    
+    def flush(self):
+        """Block until every queued snapshot has been written.
+
+        Snapshots the writer thread failed to write are retried here; if a
+        retry fails, its error is raised and the snapshot stays queued.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: not self._pending and not self._writing)
+            for path in list(self._failed):
+                self._write(path, self._failed[path])
+                del self._failed[path]
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                # Earlier failures ride along unless a newer snapshot replaced them
+                self._writing = {**self._failed, **self._pending}
+                self._pending, self._failed = {}, {}
+            failed = {}
+            for path, data in self._writing.items():
+                try:
+                    self._write(path, data)
+                except Exception:
+                    failed[path] = data  # already logged by the write function
+            with self._cond:
+                self._failed = {path: data for path, data in failed.items() if path not in self._pending}
+                self._writing = {}
+                self._cond.notify_all()
+
 
 class StorageService:
-    """File-based storage service for KME data."""
+    """File-based storage service for KME data.
+
+    With ``background_writes`` session and key pool snapshots are written by
+    a writer thread; otherwise every write is synchronous.
+    """
     
-    def __init__(self):
+    def __init__(self, background_writes: bool = False):
         self.settings = get_settings()
         self.data_dir = Path(self.settings.data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
         
         # File paths
         self.keys_file = self.data_dir / "keys.json"
+        self.keys_journal_file = self.data_dir / "keys.journal"
         self.sessions_file = self.data_dir / "sessions.json"
         self.sae_registry_file = self.data_dir / "sae_registry.json"
         self.key_pool_file = self.data_dir / "key_pool.json"
         
+        # File states whose records have been fully validated, per file set
+        self._validated_states: Dict[tuple, tuple] = {}
+        
+        # In-memory lookup indexes, rebuilt when the backing files change
+        self._keys_by_id: Dict[str, Key] = {}
+        self._keys_index_state = None
+        # IDs of unallocated keys in pool order; may hold stale IDs, checked on pop
+        self._available: deque = deque()
+        self._sae_by_id: Dict[str, SAERegistry] = {}
+        self._sae_index_state = None
+        
+        # Status counters, kept in step with the indexes and saved snapshots
+        self._unused_keys = 0
+        self._active_saes = 0
+        self._active_sessions: Optional[int] = None
+        
+        # Bumped after every write, so callers can tell when derived views are stale
+        self.generation = 0
+        
+        # Session and key pool snapshots are written by a background thread
+        self._writer = _BackgroundWriter(self._write_file) if background_writes else None
+        
         # Initialize storage
         self._initialize_storage()
     
@@ -53,69 +165,293 @@ class StorageService:
             max_size=self.settings.key_pool_size,
             key_size=self.settings.key_size
         )
-        self._save_json(self.key_pool_file, key_pool.dict())
+        self._save_json(self.key_pool_file, key_pool.__dict__)
     
     def _load_json(self, file_path: Path) -> Any:
-        """Load JSON data from file."""
+        """Load JSON data from file, or from a snapshot still queued for it."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            raw = self._writer.pending(file_path) if self._writer is not None else None
+            return orjson.loads(raw if raw is not None else file_path.read_bytes())
+        except (FileNotFoundError, orjson.JSONDecodeError) as e:
             logger.warning(f"Error loading {file_path}: {e}")
             return None
     
     def _save_json(self, file_path: Path, data: Any):
-        """Save JSON data to file."""
+        """Save JSON data to file atomically (write temp file, then rename)."""
+        self._write_file(file_path, _dumps(data))
+        self.generation += 1
+    
+    def _save_json_later(self, file_path: Path, data: Any):
+        """Serialize now, write from the background writer.
+
+        Only for files whose loss on a crash is harmless: the latest
+        snapshot is served from memory until it reaches disk.
+        """
+        if self._writer is None:
+            self._save_json(file_path, data)
+        else:
+            self._writer.submit(file_path, _dumps(data))
+            self.generation += 1
+    
+    def flush(self):
+        """Wait for queued background writes to reach disk."""
+        if self._writer is not None:
+            self._writer.flush()
+    
+    def _write_file(self, file_path: Path, data: bytes):
+        tmp_path = file_path.with_name(file_path.name + ".tmp")
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, default=str)
+            # Files hold key material: create owner-only from the start
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
         except Exception as e:
             logger.error(f"Error saving {file_path}: {e}")
+            tmp_path.unlink(missing_ok=True)
             raise
     
+    def _construct(self, model, records: List[dict], *paths: Path) -> list:
+        """Build models from the records read from ``paths``.
+
+        Records are fully validated the first time each version of the files
+        is read; rereads of unchanged files skip validation.
+        """
+        state = self._file_state(*paths)
+        if self._validated_states.get(paths) != state:
+            items = [model(**record) for record in records]
+            self._validated_states[paths] = state
+            return items
+        fields = _DATETIME_FIELDS[model]
+        items = []
+        for record in records:
+            for name in fields:
+                value = record.get(name)
+                if isinstance(value, str):
+                    record[name] = datetime.fromisoformat(value)
+            items.append(model.model_construct(**record))
+        return items
+    
+    @staticmethod
+    def _file_state(*paths: Path) -> tuple:
+        """Identity of the given files' contents: changes whenever they are rewritten or appended."""
+        state = []
+        for path in paths:
+            try:
+                st = path.stat()
+                state.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                state.append(None)
+        return tuple(state)
+    
+    def _keys_state(self) -> tuple:
+        return self._file_state(self.keys_file, self.keys_journal_file)
+    
+    def _key_index(self) -> Dict[str, Key]:
+        """Keys by ID, reloaded only if the key files changed since the last lookup."""
+        state = self._keys_state()
+        if state != self._keys_index_state:
+            self._set_key_index(self.get_keys())
+            self._keys_index_state = state
+            # The journal also carries sessions: recount them on next use
+            self._active_sessions = None
+        return self._keys_by_id
+    
+    def _set_key_index(self, keys: List[Key]):
+        self._keys_by_id = {key.key_id: key for key in keys}
+        self._available = deque(key.key_id for key in keys if _is_available(key))
+        self._unused_keys = sum(1 for key in keys if not key.is_used)
+    
+    def _set_sae_index(self, sae_registry: List[SAERegistry]):
+        self._sae_by_id = {sae.sae_id: sae for sae in sae_registry}
+        self._active_saes = sum(1 for sae in sae_registry if sae.is_active)
+    
+    def _sae_index(self) -> Dict[str, SAERegistry]:
+        """SAEs by ID, reloaded only if the registry file changed since the last lookup."""
+        state = self._file_state(self.sae_registry_file)
+        if state != self._sae_index_state:
+            self._set_sae_index(self.get_sae_registry())
+            self._sae_index_state = state
+        return self._sae_by_id
+    
+    def get_key(self, key_id: str) -> Optional[Key]:
+        """Look up a key by ID."""
+        return self._key_index().get(key_id)
+    
+    def get_sae(self, sae_id: str) -> Optional[SAERegistry]:
+        """Look up a registered SAE by ID."""
+        return self._sae_index().get(sae_id)
+    
+    def take_available_keys(self, number: int) -> Optional[List[Key]]:
+        """Remove ``number`` unallocated keys from the pool, oldest first.
+
+        Returns copies for the caller to update and journal with
+        ``update_keys``, or None (taking nothing) if too few are available.
+        """
+        keys_by_id = self._key_index()
+        available = self._available
+        taken = []
+        while available and len(taken) < number:
+            key = keys_by_id.get(available.popleft())
+            if key is not None and _is_available(key):
+                taken.append(key)
+        if len(taken) < number:
+            available.extendleft(reversed([key.key_id for key in taken]))
+            return None
+        return [key.model_copy() for key in taken]
+    
+    def key_count(self) -> int:
+        """Number of stored keys, from the in-memory index."""
+        return len(self._key_index())
+    
+    def stats(self) -> Dict[str, int]:
+        """Key, session and SAE counts for status reporting, without decoding records."""
+        keys_by_id = self._key_index()
+        self._sae_index()
+        if self._active_sessions is None:
+            self._active_sessions = sum(1 for session in self.get_sessions() if session.is_active)
+        return {
+            "active_sessions": self._active_sessions,
+            "registered_saes": self._active_saes,
+            "total_keys": len(keys_by_id),
+            "available_keys": self._unused_keys,
+        }
+    
     def get_key_pool(self) -> KeyPool:
         """Get current key pool status."""
         data = self._load_json(self.key_pool_file)
         if data is None:
             return self._create_initial_key_pool()
-        return KeyPool(**data)
+        return self._construct(KeyPool, [data], self.key_pool_file)[0]
     
     def update_key_pool(self, key_pool: KeyPool):
         """Update key pool status."""
-        self._save_json(self.key_pool_file, key_pool.dict())
+        self._save_json_later(self.key_pool_file, key_pool.__dict__)
     
-    def get_keys(self) -> List[Key]:
-        """Get all keys from storage."""
-        data = self._load_json(self.keys_file)
-        if data is None:
+    def _read_journal(self) -> List[dict]:
+        """Read journal records (keys and sessions), skipping a torn final line."""
+        try:
+            raw = self.keys_journal_file.read_bytes()
+        except FileNotFoundError:
             return []
-        return [Key(**key_data) for key_data in data]
+        records = []
+        for line in raw.splitlines():
+            try:
+                records.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                logger.warning(f"Skipping unreadable record in {self.keys_journal_file}")
+        return records
+    
+    def _append_journal(self, kind: str, keys: List[Key], sessions: List[Session] = ()):
+        """Append one JSON line per changed key or new session in a single write.
+
+        Compacts once the journal is large.
+        """
+        before = self._keys_state()
+        lines = b"".join(
+            [_dumps({"op": kind, "key": key.__dict__}) + b"\n" for key in keys]
+            + [_dumps({"op": "session", "session": session.__dict__}) + b"\n" for session in sessions]
+        )
+        # Journal holds key material: create owner-only, like the snapshot files
+        try:
+            fd = os.open(self.keys_journal_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(lines)
+                size = f.tell()
+        except Exception:
+            # Keys may have been taken from the index: rebuild it from disk
+            self._keys_index_state = None
+            raise
+        if size >= KEY_JOURNAL_COMPACT_BYTES:
+            self.compact_keys()
+        elif self._keys_index_state == before:
+            # Index was current before this write: apply the change in place
+            for key in keys:
+                old = self._keys_by_id.get(key.key_id)
+                if old is None and _is_available(key):
+                    self._available.append(key.key_id)
+                self._unused_keys += (not key.is_used) - (old is not None and not old.is_used)
+                self._keys_by_id[key.key_id] = key
+            self._keys_index_state = self._keys_state()
+            if self._active_sessions is not None:
+                self._active_sessions += sum(1 for session in sessions if session.is_active)
+        else:
+            self._active_sessions = None
+        self.generation += 1
+    
+    def get_keys(self) -> List[Key]:
+        """Get all keys from storage (snapshot plus journaled changes)."""
+        data = self._load_json(self.keys_file) or []
+        keys = {key_data["key_id"]: key_data for key_data in data}
+        for record in self._read_journal():
+            key_data = record.get("key")
+            if key_data is not None:
+                keys[key_data["key_id"]] = key_data
+        return self._construct(Key, list(keys.values()), self.keys_file, self.keys_journal_file)
+    
+    def add_keys(self, keys: List[Key]):
+        """Record newly generated keys."""
+        self._append_journal("add", keys)
+    
+    def update_keys(self, keys: List[Key]):
+        """Record changes to existing keys."""
+        self._append_journal("update", keys)
+    
+    def atomic_update(self, keys: List[Key], sessions_append: List[Session]):
+        """Record key changes and new sessions together in one journal write."""
+        self._append_journal("update", keys, sessions_append)
     
     def save_keys(self, keys: List[Key]):
-        """Save keys to storage."""
-        self._save_json(self.keys_file, [key.dict() for key in keys])
+        """Save a full snapshot of the keys, replacing the journal."""
+        if any("session" in record for record in self._read_journal()):
+            # Journaled sessions must be on disk before the journal goes
+            self.save_sessions(self.get_sessions())
+            self.flush()
+        self._save_json(self.keys_file, [key.__dict__ for key in keys])
+        # Replaying the journal over the new snapshot would be a no-op, so a
+        # crash before this unlink is harmless
+        self.keys_journal_file.unlink(missing_ok=True)
+        self._set_key_index(keys)
+        self._keys_index_state = self._keys_state()
+    
+    def compact_keys(self):
+        """Fold the journal into the keys.json and sessions.json snapshots."""
+        if self.keys_journal_file.exists():
+            self.save_keys(self.get_keys())
     
     def get_sessions(self) -> List[Session]:
-        """Get all sessions from storage."""
-        data = self._load_json(self.sessions_file)
-        if data is None:
-            return []
-        return [Session(**session_data) for session_data in data]
+        """Get all sessions from storage (snapshot plus journaled sessions)."""
+        data = self._load_json(self.sessions_file) or []
+        sessions = {session_data["session_id"]: session_data for session_data in data}
+        for record in self._read_journal():
+            session_data = record.get("session")
+            if session_data is not None:
+                sessions[session_data["session_id"]] = session_data
+        return self._construct(Session, list(sessions.values()), self.sessions_file, self.keys_journal_file)
     
     def save_sessions(self, sessions: List[Session]):
         """Save sessions to storage."""
-        self._save_json(self.sessions_file, [session.dict() for session in sessions])
+        self._save_json_later(self.sessions_file, [session.__dict__ for session in sessions])
+        self._active_sessions = sum(1 for session in sessions if session.is_active)
     
     def get_sae_registry(self) -> List[SAERegistry]:
         """Get SAE registry from storage."""
         data = self._load_json(self.sae_registry_file)
         if data is None:
             return []
-        return [SAERegistry(**sae_data) for sae_data in data]
+        return self._construct(SAERegistry, data, self.sae_registry_file)
     
     def save_sae_registry(self, sae_registry: List[SAERegistry]):
         """Save SAE registry to storage."""
-        self._save_json(self.sae_registry_file, [sae.dict() for sae in sae_registry])
+        self._save_json(self.sae_registry_file, [sae.__dict__ for sae in sae_registry])
+        self._set_sae_index(sae_registry)
+        self._sae_index_state = self._file_state(self.sae_registry_file)
+    
+    def upsert_sae(self, sae: SAERegistry):
+        """Add or replace one SAE registration."""
+        sae_by_id = dict(self._sae_index())
+        sae_by_id[sae.sae_id] = sae
+        self.save_sae_registry(list(sae_by_id.values()))
     
     def get_storage_data(self) -> StorageData:
         """Get complete storage data."""
@@ -131,4 +467,13 @@ class StorageService:
         self.save_keys(data.keys)
         self.save_sessions(data.sessions)
         self.save_sae_registry(data.sae_registry)
-        self.update_key_pool(data.key_pool) 
+        self.update_key_pool(data.key_pool)
+
+
+@lru_cache(maxsize=1)
+def get_storage_service() -> StorageService:
+    """Create and cache the shared StorageService instance.
+
+    Only the shared instance runs a background writer thread.
+    """
+    return StorageService(background_writes=True)
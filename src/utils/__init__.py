@@ -2,4 +2,6 @@
 Utility functions for Easy-KME server.
 """
 
-__all__ = [] 
+from .timeutils import utcnow, utcnow_cached
+
+__all__ = ["utcnow", "utcnow_cached"]
@@ -0,0 +1,30 @@
+"""
+Time helpers for Easy-KME server.
+"""
+
+import time
+from datetime import datetime, timezone
+
+# (monotonic time of last refresh, cached UTC datetime), replaced as a whole
+# so concurrent readers never see a half-updated pair
+_now_cache = (float("-inf"), None)
+
+
+def utcnow() -> datetime:
+    """Return the current time as a timezone-aware UTC datetime."""
+    return datetime.now(timezone.utc)
+
+
+def utcnow_cached() -> datetime:
+    """Like utcnow(), but refreshed at most once per second.
+
+    For audit timestamps (creation, last seen) where sub-second precision
+    is not needed.
+    """
+    global _now_cache
+    refreshed_at, value = _now_cache
+    now = time.monotonic()
+    if now - refreshed_at >= 1.0:
+        value = utcnow()
+        _now_cache = (now, value)
+    return value
@@ -0,0 +1,81 @@
+"""
+Shared fixtures for the Easy-KME API tests.
+"""
+
+import os
+
+# Under pytest-xdist each worker process gets its own data directory, so
+# workers never allocate from the same key store. Must run before the app
+# (and its cached settings) is imported.
+_xdist_worker = os.environ.get("PYTEST_XDIST_WORKER")
+if _xdist_worker:
+    os.environ["DATA_DIR"] = os.path.join(os.environ.get("DATA_DIR", "./data"), _xdist_worker)
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api import middleware
+from src.config import get_settings
+from src.main import app
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "real_auth: run without the fake SAE authentication")
+
+
+@pytest.fixture(scope="session")
+def client():
+    """One TestClient (and app lifespan) for the whole test session.
+
+    Inside the ``with`` block every request reuses the same event loop
+    portal instead of starting one per call.
+    """
+    with TestClient(app, raise_server_exceptions=True, backend="asyncio") as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def client_no_raise(client):
+    """Session client that returns server errors as responses instead of raising.
+
+    Shares the app state set up by the ``client`` lifespan.
+    """
+    return TestClient(app, raise_server_exceptions=False, backend="asyncio")
+
+
+@pytest.fixture(scope="session")
+def settings():
+    """The cached application settings."""
+    return get_settings()
+
+
+def _header_sae_id(request):
+    return request.headers.get("x-sae-id", "SAE_001")
+
+
+@pytest.fixture(autouse=True)
+def sae_auth(request, monkeypatch):
+    """Authenticate requests as the SAE named in the x-sae-id header (default SAE_001).
+
+    Tests marked ``real_auth`` keep the real nginx header authentication.
+    """
+    if request.node.get_closest_marker("real_auth") is None:
+        monkeypatch.setattr(middleware, "authenticate_client", _header_sae_id)
+
+
+@pytest.fixture
+def swap_auth(monkeypatch):
+    """Return a function that authenticates every request as the given SAE for this test."""
+    def swap(sae_id):
+        monkeypatch.setattr(middleware, "authenticate_client", lambda request: sae_id)
+    return swap
+
+
+@pytest.fixture(scope="module")
+def seeded_keys(client):
+    """IDs of keys SAE_001 obtained for SAE_002, shared by a test module."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(middleware, "authenticate_client", _header_sae_id)
+        r = client.post("/api/v1/keys/SAE_002/enc_keys", json={"number": 4, "size": 256})
+    assert r.status_code == 200
+    return [k["key_ID"] for k in r.json()["keys"]]
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test certificate verification in the authentication service.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from src.services.auth_service import AuthService
+
+
+def make_name(cn):
+    return x509.Name([x509.NameAttribute(x509.NameOID.COMMON_NAME, cn)])
+
+
+def make_cert(subject, issuer, public_key, signing_key):
+    now = datetime.now(timezone.utc)
+    return (
+        x509.CertificateBuilder()
+        .subject_name(make_name(subject))
+        .issuer_name(make_name(issuer))
+        .public_key(public_key)
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + timedelta(days=1))
+        .sign(signing_key, hashes.SHA256())
+    )
+
+
+def test_verification_result_is_cached_per_certificate():
+    ca_key = ec.generate_private_key(ec.SECP256R1())
+    ca_cert = make_cert("Test CA", "Test CA", ca_key.public_key(), ca_key)
+    sae_key = ec.generate_private_key(ec.SECP256R1())
+    client_der = make_cert("SAE_001", "Test CA", sae_key.public_key(), ca_key).public_bytes(
+        serialization.Encoding.DER
+    )
+
+    auth = AuthService()
+    auth.ca_cert = ca_cert
+    calls = []
+    verify = auth._verify_signature
+    auth._verify_signature = lambda cert: calls.append(cert) or verify(cert)
+
+    assert auth.verify_client_certificate(client_der)
+    assert auth.verify_client_certificate(client_der)
+    assert len(calls) == 1
+    assert auth.extract_sae_id_from_cert(client_der) == "SAE_001"
+
+    # A certificate signed by another key fails and is cached as failed
+    rogue_key = ec.generate_private_key(ec.SECP256R1())
+    rogue_der = make_cert("SAE_001", "Test CA", sae_key.public_key(), rogue_key).public_bytes(
+        serialization.Encoding.DER
+    )
+    assert not auth.verify_client_certificate(rogue_der)
+    assert not auth.verify_client_certificate(rogue_der)
+    assert len(calls) == 2
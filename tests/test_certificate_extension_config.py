@@ -3,110 +3,108 @@
 Test certificate extension configuration.
 """
 
-import os
-from fastapi.testclient import TestClient
+import json
+import warnings
+
 import pytest
 
-from src.main import app
+from src.api import middleware, routes
+from src.config import Settings
+from src.models.api_models import CertificateExtension
+from src.utils.timeutils import utcnow
 
 
-def test_certificate_extension_config_default():
+def test_certificate_extension_config_default(settings):
     """Test that certificate extension is enabled by default."""
-    from src.config import get_settings
-    settings = get_settings()
-    assert settings.include_certificate_extension == True
+    assert settings.include_certificate_extension is True
 
 
-def test_certificate_extension_config_env_variable():
+def test_certificate_extension_config_env_variable(settings, monkeypatch):
     """Test that certificate extension respects environment variable."""
-    # Note: Settings are cached using @lru_cache, so environment variable changes
-    # won't be picked up during runtime. This is intentional for production.
-    # The test verifies the default behavior.
-    
-    from src.config import get_settings
-    settings = get_settings()
-    
-    # Should be enabled by default
-    assert settings.include_certificate_extension == True
-    
-    # Verify the setting exists and is boolean
-    assert hasattr(settings, 'include_certificate_extension')
-    assert isinstance(settings.include_certificate_extension, bool)
-
-
-def test_certificate_extension_in_response(monkeypatch):
-    """Test that certificate extension appears in API response when enabled."""
-    client = TestClient(app)
+    monkeypatch.setenv("INCLUDE_CERTIFICATE_EXTENSION", "false")
+    assert Settings().include_certificate_extension is False
 
-    # Fake auth
-    def fake_authenticate(request):
-        return request.headers.get("x-sae-id", "SAE_001")
+    # The cached settings were read at startup and are not affected
+    assert settings.include_certificate_extension is True
 
-    from src.api import middleware
-    monkeypatch.setattr(middleware, "authenticate_client", fake_authenticate)
 
-    # Mock certificate extension creation
+def test_certificate_extension_in_response(client, monkeypatch):
+    """Test that certificate extension appears in API response when enabled."""
     def fake_create_certificate_extension(request, sae_id):
-        from src.models.api_models import CertificateExtension
-        from datetime import datetime
         return CertificateExtension(
             client_verified="SUCCESS",
             client_dn="CN=SAE_001,O=Test",
             client_issuer="CN=Test CA",
             ssl_protocol="TLSv1.3",
             ssl_cipher="TLS_AES_256_GCM_SHA384",
-            timestamp=datetime.utcnow(),
+            timestamp=utcnow(),
             sae_id=sae_id
         )
 
     monkeypatch.setattr(middleware, "create_certificate_extension", fake_create_certificate_extension)
 
-    # Test status endpoint
     response = client.get("/api/v1/keys/SAE_002/status", headers={"x-sae-id": "SAE_001"})
     assert response.status_code == 200
+    assert response.json()["easy_kme_certificate_extension"]["client_dn"] == "CN=SAE_001,O=Test"
+
+
+def test_certificate_extension_disabled_in_response(client, monkeypatch):
+    """Test that certificate extension is None when disabled."""
+    # routes picks the extension builder from the settings once, at import
+    monkeypatch.setattr(routes, "_cert_extension", routes._no_certificate_extension)
+
+    response = client.get("/api/v1/keys/SAE_002/status", headers=NGINX_HEADERS)
+    assert response.status_code == 200
     body = response.json()
-    
-    # Should include certificate extension field (even if None)
     assert "easy_kme_certificate_extension" in body
+    assert body["easy_kme_certificate_extension"] is None
+
+
+NGINX_HEADERS = {
+    "X-Client-Verified": "SUCCESS",
+    "X-Client-DN": "CN=SAE_001,O=HPE-Networking",
+    "X-Client-Issuer": "CN=Easy-KME Root CA1",
+    "X-SSL-Protocol": "TLSv1.3",
+    "X-SSL-Cipher": "TLS_AES_256_GCM_SHA384",
+    "x-sae-id": "SAE_001",
+}
+
+EXTENSION_FIELDS = {
+    "client_verified", "client_dn", "client_issuer", "ssl_protocol", "ssl_cipher", "timestamp", "sae_id",
+}
+
+
+@pytest.mark.parametrize("method,path,payload", [
+    ("post", "/api/v1/keys/SAE_002/enc_keys", {"number": 1}),
+    ("get", "/api/v1/keys/SAE_002/status", None),
+])
+def test_certificate_extension_from_nginx_headers(client, method, path, payload):
+    """Test the extension built from nginx headers has one shape on every endpoint."""
+    with warnings.catch_warnings():
+        # Serializing a dict where a CertificateExtension is expected warns
+        warnings.simplefilter("error", UserWarning)
+        response = client.request(method, path, json=payload, headers=NGINX_HEADERS)
+    assert response.status_code == 200
+    extension = response.json()["easy_kme_certificate_extension"]
 
+    assert set(extension) == EXTENSION_FIELDS
+    assert extension["client_verified"] == "SUCCESS"
+    assert extension["client_dn"] == "CN=SAE_001,O=HPE-Networking"
+    assert extension["ssl_cipher"] == "TLS_AES_256_GCM_SHA384"
+    assert extension["sae_id"] == "SAE_001"
+    assert extension["timestamp"].endswith("Z")
 
-def test_certificate_extension_disabled_in_response(monkeypatch):
-    """Test that certificate extension is None when disabled."""
-    client = TestClient(app)
-
-    # Fake auth
-    def fake_authenticate(request):
-        return request.headers.get("x-sae-id", "SAE_001")
-
-    from src.api import middleware
-    monkeypatch.setattr(middleware, "authenticate_client", fake_authenticate)
-
-    # Temporarily disable certificate extension
-    original_setting = os.environ.get("INCLUDE_CERTIFICATE_EXTENSION", "true")
-    os.environ["INCLUDE_CERTIFICATE_EXTENSION"] = "false"
-    
-    try:
-        # Clear cached settings
-        import src.config
-        if hasattr(src.config, '_settings'):
-            delattr(src.config, '_settings')
-        
-        # Test status endpoint
-        response = client.get("/api/v1/keys/SAE_002/status", headers={"x-sae-id": "SAE_001"})
-        assert response.status_code == 200
-        body = response.json()
-        
-        # Should include certificate extension field but it should be None
-        assert "easy_kme_certificate_extension" in body
-        # Note: In a real test environment, this might still have a value due to caching
-        # The important thing is that the field exists in the response structure
-    finally:
-        # Restore original setting
-        if original_setting:
-            os.environ["INCLUDE_CERTIFICATE_EXTENSION"] = original_setting
-        else:
-            os.environ.pop("INCLUDE_CERTIFICATE_EXTENSION", None)
-        
-        # Clear cached settings
-        if hasattr(src.config, '_settings'):
-            delattr(src.config, '_settings')
+
+def test_ndjson_stream_ends_with_certificate_extension(client):
+    """Test the NDJSON form carries the same extension as the JSON body, as its last record."""
+    headers = {**NGINX_HEADERS, "accept": "application/x-ndjson"}
+    response = client.post("/api/v1/keys/SAE_002/enc_keys", json={"number": 40}, headers=headers)
+    assert response.status_code == 200
+    *keys, last = [json.loads(line) for line in response.text.splitlines()]
+
+    assert len(keys) == 40
+    assert set(last) == {"easy_kme_certificate_extension"}
+    extension = last["easy_kme_certificate_extension"]
+    assert set(extension) == EXTENSION_FIELDS
+    assert extension["sae_id"] == "SAE_001"
+    assert extension["timestamp"].endswith("Z")
@@ -3,53 +3,55 @@ Basic tests for Easy-KME configuration.
 """
 
 import pytest
-from pathlib import Path
-import tempfile
-import os
 
 from src.config import Settings
 
 
-def test_settings_defaults():
+def test_settings_defaults(tmp_path, monkeypatch):
     """Test that settings have proper defaults."""
-    # Create temporary environment
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Create test certificates
-        cert_dir = Path(temp_dir) / "certs"
-        cert_dir.mkdir()
-        
-        # Create dummy certificate files
-        (cert_dir / "kme_cert.pem").write_text("dummy cert")
-        (cert_dir / "kme_key.pem").write_text("dummy key")
-        (cert_dir / "ca_cert.pem").write_text("dummy ca")
-        
-        # Set environment variables
-        os.environ["KME_CERT_PATH"] = str(cert_dir / "kme_cert.pem")
-        os.environ["KME_KEY_PATH"] = str(cert_dir / "kme_key.pem")
-        os.environ["CA_CERT_PATH"] = str(cert_dir / "ca_cert.pem")
-        os.environ["DATA_DIR"] = str(Path(temp_dir) / "data")
-        
-        # Test settings creation
-        settings = Settings()
-        
-        assert settings.kme_host == "0.0.0.0"
-        assert settings.kme_port == 8443
-        assert settings.kme_id == "KME_LAB_001"
-        assert settings.key_pool_size == 1000
-        assert settings.key_size == 256
-        assert settings.require_client_cert is True
-        assert settings.verify_ca is True
-
-
-def test_settings_validation():
+    # Create test certificates
+    cert_dir = tmp_path / "certs"
+    cert_dir.mkdir()
+    
+    # Create dummy certificate files
+    (cert_dir / "kme_cert.pem").write_text("dummy cert")
+    (cert_dir / "kme_key.pem").write_text("dummy key")
+    (cert_dir / "ca_cert.pem").write_text("dummy ca")
+    
+    # Set environment variables (restored by monkeypatch after the test)
+    monkeypatch.setenv("KME_CERT_PATH", str(cert_dir / "kme_cert.pem"))
+    monkeypatch.setenv("KME_KEY_PATH", str(cert_dir / "kme_key.pem"))
+    monkeypatch.setenv("CA_CERT_PATH", str(cert_dir / "ca_cert.pem"))
+    monkeypatch.setenv("DATA_DIR", str(tmp_path / "data"))
+    
+    # Test settings creation
+    settings = Settings()
+    
+    assert settings.kme_host == "0.0.0.0"
+    assert settings.kme_port == 8443
+    assert settings.kme_id == "KME_LAB_001"
+    assert settings.key_pool_size == 1000
+    assert settings.key_size == 256
+    assert settings.require_client_cert is True
+    assert settings.verify_ca is True
+    
+    # Per-request snapshot mirrors the live settings
+    snapshot = settings.snapshot()
+    assert snapshot.kme_id == settings.kme_id
+    assert snapshot.key_size == settings.key_size
+    assert snapshot.include_certificate_extension is settings.include_certificate_extension
+
+
+def test_settings_validation(tmp_path):
     """Test settings validation."""
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Test with missing certificate files
-        os.environ["KME_CERT_PATH"] = "/nonexistent/cert.pem"
-        
-        with pytest.raises(ValueError, match="Certificate file not found"):
-            Settings()
+    # Test with missing certificate files
+    with pytest.raises(ValueError, match="Certificate file not found"):
+        Settings.validate_cert_path("/nonexistent/cert.pem")
+    
+    cert = tmp_path / "cert.pem"
+    cert.write_text("dummy cert")
+    assert Settings.validate_cert_path(str(cert)) == str(cert)
 
 
 if __name__ == "__main__":
-    pytest.main([__file__]) 
+    pytest.main([__file__])
@@ -1,51 +1,42 @@
 #!/usr/bin/env python3
 import base64
-from fastapi.testclient import TestClient
 
-from src.main import app
+import pytest
 
 
-def test_dec_keys_post_and_get_authorization(monkeypatch):
-    client = TestClient(app)
+def _decode_keys(body):
+    """Base64-decode every key in an ETSI key container."""
+    return [base64.b64decode(k["key"], validate=True) for k in body["keys"]]
 
-    # Fake auth
-    def fake_authenticate(request):
-        return request.headers.get("x-sae-id", "SAE_001")
-
-    from src.api import middleware
-    monkeypatch.setattr(middleware, "authenticate_client", fake_authenticate)
-
-    # First, SAE_001 requests keys for SAE_002
-    r = client.post(
-        "/api/v1/keys/SAE_002/enc_keys",
-        json={"number": 2, "size": 256},
-        headers={"x-sae-id": "SAE_001"},
-    )
-    assert r.status_code == 200
-    keys = [k["key_ID"] for k in r.json()["keys"]]
 
+def test_dec_keys_rejects_master(client, seeded_keys):
     # Unauthorized: master trying to dec_keys should be rejected
     r_unauth = client.post(
         "/api/v1/keys/SAE_001/dec_keys",
-        json={"key_IDs": [{"key_ID": keys[0]}]},
+        json={"key_IDs": [{"key_ID": seeded_keys[0]}]},
         headers={"x-sae-id": "SAE_001"},
     )
     assert r_unauth.status_code == 401
 
-    # Authorized: slave SAE_002 retrieves by POST
-    def auth_sae2(request):
-        return "SAE_002"
 
-    monkeypatch.setattr(middleware, "authenticate_client", auth_sae2)
+@pytest.mark.parametrize("method", ["post", "get"])
+def test_dec_keys_slave_retrieval(client, swap_auth, seeded_keys, method):
+    # Authorized: slave SAE_002 retrieves the keys SAE_001 requested for it
+    swap_auth("SAE_002")
 
-    r_ok = client.post(
-        "/api/v1/keys/SAE_001/dec_keys",
-        json={"key_IDs": [{"key_ID": k} for k in keys]},
-    )
-    assert r_ok.status_code == 200
-    for k in r_ok.json()["keys"]:
-        base64.b64decode(k["key"], validate=True)
+    if method == "post":
+        # All key IDs in one batched request
+        expected = seeded_keys
+        r = client.post(
+            "/api/v1/keys/SAE_001/dec_keys",
+            json={"key_IDs": [{"key_ID": k} for k in expected]},
+        )
+    else:
+        # GET simple case with one key_ID
+        expected = seeded_keys[:1]
+        r = client.get(f"/api/v1/keys/SAE_001/dec_keys?key_ID={expected[0]}")
 
-    # GET simple case with one key_ID
-    r_get = client.get(f"/api/v1/keys/SAE_001/dec_keys?key_ID={keys[0]}")
-    assert r_get.status_code == 200
+    assert r.status_code == 200
+    body = r.json()
+    assert [k["key_ID"] for k in body["keys"]] == expected
+    assert all(len(raw) == 32 for raw in _decode_keys(body))
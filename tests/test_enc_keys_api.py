@@ -1,21 +1,9 @@
 #!/usr/bin/env python3
 import base64
-from fastapi.testclient import TestClient
-import pytest
+import json
 
-from src.main import app
-
-
-def test_enc_keys_post_and_get(monkeypatch):
-    client = TestClient(app)
-
-    # Fake auth
-    def fake_authenticate(request):
-        return request.headers.get("x-sae-id", "SAE_001")
-
-    from src.api import middleware
-    monkeypatch.setattr(middleware, "authenticate_client", fake_authenticate)
 
+def test_enc_keys_post_and_get(client):
     # POST spec request
     req = {
         "number": 2,
@@ -27,13 +15,44 @@ def test_enc_keys_post_and_get(monkeypatch):
     body = r.json()
     assert "keys" in body and isinstance(body["keys"], list)
     assert len(body["keys"]) == 2
-    for k in body["keys"]:
-        assert "key_ID" in k and "key" in k
-        # validate base64
-        base64.b64decode(k["key"], validate=True)
+    assert all("key_ID" in k and "key" in k for k in body["keys"])
+    # validate base64: every key decodes to 256 bits
+    assert [len(base64.b64decode(k["key"], validate=True)) for k in body["keys"]] == [32, 32]
 
     # GET simple case
     r2 = client.get("/api/v1/keys/SAE_002/enc_keys?number=1&size=256", headers={"x-sae-id": "SAE_001"})
     assert r2.status_code == 200
     body2 = r2.json()
     assert len(body2["keys"]) == 1
+
+
+def test_enc_keys_ndjson_stream(client):
+    headers = {"x-sae-id": "SAE_001", "accept": "application/x-ndjson"}
+
+    # Large containers stream one key object per line when requested
+    r = client.post("/api/v1/keys/SAE_002/enc_keys", json={"number": 40, "size": 256}, headers=headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert len(lines) == 40
+    for k in lines:
+        assert "key_ID" in k and "key" in k
+
+    # Small containers keep the regular ETSI JSON body
+    r2 = client.post("/api/v1/keys/SAE_002/enc_keys", json={"number": 2, "size": 256}, headers=headers)
+    assert r2.status_code == 200
+    assert len(r2.json()["keys"]) == 2
+
+
+def test_enc_keys_limits_rejected_as_400(client):
+    headers = {"x-sae-id": "SAE_001"}
+
+    r = client.post("/api/v1/keys/SAE_002/enc_keys", json={"number": 10_000}, headers=headers)
+    assert r.status_code == 400
+    body = r.json()
+    assert "max_key_per_request" in body["detail"]
+
+    r = client.get("/api/v1/keys/SAE_002/enc_keys?size=8192", headers=headers)
+    assert r.status_code == 400
+    body = r.json()
+    assert "'size' must be between" in body["detail"]
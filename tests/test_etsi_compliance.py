@@ -4,171 +4,121 @@ Test ETSI GS QKD 014 compliance for enc_keys route.
 """
 
 import base64
-import json
-from fastapi.testclient import TestClient
-import pytest
-
-from src.main import app
-
-
-def test_etsi_enc_keys_compliance(monkeypatch):
-    """Test that enc_keys route returns data in exact ETSI format."""
-    client = TestClient(app)
-
-    # Fake auth
-    def fake_authenticate(request):
-        return request.headers.get("x-sae-id", "SAE_001")
+from uuid import UUID
 
-    from src.api import middleware
-    monkeypatch.setattr(middleware, "authenticate_client", fake_authenticate)
+import pytest
 
-    # Test POST with ETSI-compliant request
-    request_data = {
-        "number": 2,
-        "size": 256,
-        "additional_slave_SAE_IDs": ["SAE_003"],
-        "extension_mandatory": [],
-        "extension_optional": []
-    }
-    
-    response = client.post(
-        "/api/v1/keys/SAE_002/enc_keys", 
-        json=request_data, 
-        headers={"x-sae-id": "SAE_001"}
-    )
-    
-    assert response.status_code == 200
-    body = response.json()
-    
+# ETSI GS QKD 014 key object fields
+REQUIRED_KEY_FIELDS = frozenset({"key_ID", "key"})
+
+ENC_KEYS_URL = "/api/v1/keys/SAE_002/enc_keys"
+MASTER_HEADERS = {"x-sae-id": "SAE_001"}
+
+# Request payloads shared by the tests below
+PAYLOAD_SINGLE_256 = {"number": 1, "size": 256}
+PAYLOAD_SIZE_NOT_MULTIPLE_OF_8 = {"number": 1, "size": 255}
+PAYLOAD_EXTENSION_MANDATORY = {**PAYLOAD_SINGLE_256, "extension_mandatory": [{"test_extension": "value"}]}
+PAYLOAD_DEFAULTS = {}
+PAYLOAD_FULL = {
+    "number": 2,
+    "size": 256,
+    "additional_slave_SAE_IDs": ["SAE_003"],
+    "extension_mandatory": [],
+    "extension_optional": []
+}
+PAYLOAD_UNKNOWN_FIELD = {**PAYLOAD_SINGLE_256, "key_format": "hex"}
+
+
+def _assert_etsi_keys(body, n, size):
+    """Check an ETSI key container holds ``n`` keys of ``size`` bits."""
     # Verify ETSI-compliant response structure
     assert "keys" in body
     assert isinstance(body["keys"], list)
-    assert len(body["keys"]) == 2
+    assert len(body["keys"]) == n
     
     # Verify each key object has required ETSI fields
     for key_obj in body["keys"]:
-        assert "key_ID" in key_obj
-        assert "key" in key_obj
+        missing = REQUIRED_KEY_FIELDS - key_obj.keys()
+        assert not missing, f"missing fields: {missing}"
         assert isinstance(key_obj["key_ID"], str)
         assert isinstance(key_obj["key"], str)
         
-        # Verify key_ID is UUID format
-        assert len(key_obj["key_ID"]) == 36  # UUID length
-        assert key_obj["key_ID"].count("-") == 4  # UUID format
+        # Verify key_ID is a UUID in canonical (dashed, lowercase) form
+        assert str(UUID(key_obj["key_ID"])) == key_obj["key_ID"]
         
         # Verify key is valid base64
         try:
             decoded_key = base64.b64decode(key_obj["key"], validate=True)
-            assert len(decoded_key) == 32  # 256 bits = 32 bytes
+            assert len(decoded_key) == size // 8
         except Exception as e:
             pytest.fail(f"Invalid base64 key: {e}")
-    
-    # Verify optional fields are present (even if None)
-    assert "key_container_extension" in body
-    assert "easy_kme_certificate_extension" in body
 
 
-def test_etsi_enc_keys_validation(monkeypatch):
-    """Test ETSI validation requirements."""
-    client = TestClient(app)
-
-    # Fake auth
-    def fake_authenticate(request):
-        return request.headers.get("x-sae-id", "SAE_001")
-
-    from src.api import middleware
-    monkeypatch.setattr(middleware, "authenticate_client", fake_authenticate)
-
-    # Test key size not multiple of 8 (should fail)
-    request_data = {
-        "number": 1,
-        "size": 255,  # Not multiple of 8
-    }
-    
-    response = client.post(
-        "/api/v1/keys/SAE_002/enc_keys", 
-        json=request_data, 
-        headers={"x-sae-id": "SAE_001"}
-    )
+@pytest.mark.parametrize("payload,status,err_substr", [
+    (PAYLOAD_SIZE_NOT_MULTIPLE_OF_8, 400, "size shall be a multiple of 8"),
+    # extension_mandatory: we don't support any
+    (PAYLOAD_EXTENSION_MANDATORY, 400, "not all extension_mandatory parameters are supported"),
+    # Empty request uses defaults: 1 key of 256 bits
+    (PAYLOAD_DEFAULTS, 200, None),
+    (PAYLOAD_SINGLE_256, 200, None),
+    (PAYLOAD_FULL, 200, None),
+])
+def test_enc_keys_contract(client, payload, status, err_substr):
+    """Test that enc_keys returns exact ETSI format and enforces ETSI validation."""
+    response = client.post(ENC_KEYS_URL, json=payload, headers=MASTER_HEADERS)
+    
+    assert response.status_code == status
+    body = response.json()
     
-    assert response.status_code == 400
-    assert "size shall be a multiple of 8" in response.json()["detail"]
-
-    # Test extension_mandatory (should fail as we don't support any)
-    request_data = {
-        "number": 1,
-        "size": 256,
-        "extension_mandatory": [{"test_extension": "value"}]
-    }
+    if status != 200:
+        assert err_substr in body["detail"]
+        return
     
-    response = client.post(
-        "/api/v1/keys/SAE_002/enc_keys", 
-        json=request_data, 
-        headers={"x-sae-id": "SAE_001"}
-    )
+    _assert_etsi_keys(body, payload.get("number", 1), payload.get("size", 256))
     
-    assert response.status_code == 400
-    assert "not all extension_mandatory parameters are supported" in response.json()["detail"]
+    # Verify optional fields are present (even if None)
+    assert "key_container_extension" in body
+    assert "easy_kme_certificate_extension" in body
 
 
-def test_etsi_enc_keys_get_variant(monkeypatch):
+def test_etsi_enc_keys_get_variant(client):
     """Test GET variant for simple cases."""
-    client = TestClient(app)
-
-    # Fake auth
-    def fake_authenticate(request):
-        return request.headers.get("x-sae-id", "SAE_001")
-
-    from src.api import middleware
-    monkeypatch.setattr(middleware, "authenticate_client", fake_authenticate)
-
     # Test GET with query parameters
-    response = client.get(
-        "/api/v1/keys/SAE_002/enc_keys?number=1&size=256", 
-        headers={"x-sae-id": "SAE_001"}
-    )
+    response = client.get(ENC_KEYS_URL, params=PAYLOAD_SINGLE_256, headers=MASTER_HEADERS)
     
     assert response.status_code == 200
     body = response.json()
     
     # Verify same ETSI structure
-    assert "keys" in body
-    assert len(body["keys"]) == 1
-    
-    key_obj = body["keys"][0]
-    assert "key_ID" in key_obj
-    assert "key" in key_obj
-    
-    # Verify key size
-    decoded_key = base64.b64decode(key_obj["key"], validate=True)
-    assert len(decoded_key) == 32  # 256 bits = 32 bytes
-
-
-def test_etsi_enc_keys_default_values(monkeypatch):
-    """Test that default values work correctly."""
-    client = TestClient(app)
-
-    # Fake auth
-    def fake_authenticate(request):
-        return request.headers.get("x-sae-id", "SAE_001")
+    _assert_etsi_keys(body, 1, 256)
 
-    from src.api import middleware
-    monkeypatch.setattr(middleware, "authenticate_client", fake_authenticate)
 
-    # Test with empty request (should use defaults)
-    response = client.post(
-        "/api/v1/keys/SAE_002/enc_keys", 
-        json={}, 
-        headers={"x-sae-id": "SAE_001"}
-    )
+def test_etsi_enc_keys_rejects_unknown_fields(client):
+    """Test that non-ETSI request fields are rejected with 400."""
+    response = client.post(ENC_KEYS_URL, json=PAYLOAD_UNKNOWN_FIELD, headers=MASTER_HEADERS)
     
-    assert response.status_code == 200
+    assert response.status_code == 400
     body = response.json()
-    
-    # Should return 1 key with default size
-    assert len(body["keys"]) == 1
-    
-    key_obj = body["keys"][0]
-    decoded_key = base64.b64decode(key_obj["key"], validate=True)
-    # Default key size should be 256 bits (32 bytes)
-    assert len(decoded_key) == 32
+    detail = body["detail"]
+    assert "Invalid fields detected" in detail
+    assert "key_format" in detail
+
+
+def _refs(node):
+    if isinstance(node, dict):
+        if "$ref" in node:
+            yield node["$ref"]
+        for value in node.values():
+            yield from _refs(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _refs(value)
+
+
+def test_openapi_references_resolve(client):
+    """Every $ref in the served OpenAPI document names a component schema."""
+    doc = client.get("/openapi.json").json()
+    schemas = doc["components"]["schemas"]
+    dangling = {ref for ref in _refs(doc) if ref.rsplit("/", 1)[-1] not in schemas}
+    assert not dangling
+    assert {"KeyRequestSpec", "KeyIDsSpec", "KeyIDRef"} <= schemas.keys()
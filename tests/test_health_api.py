@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test client certificate parsing for the /health endpoint.
+"""
+
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from src import main
+
+
+def make_cert_pem():
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([
+        x509.NameAttribute(x509.NameOID.COMMON_NAME, "SAE_001"),
+        x509.NameAttribute(x509.NameOID.ORGANIZATION_NAME, "HPE-Networking"),
+    ])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def test_parse_cert_cached_reuses_parsed_certificate():
+    der = main._pem_to_der(make_cert_pem())
+    main._CERT_CACHE.clear()
+
+    info = main._parse_cert_cached(der)
+    assert info["subject"]["common_name"] == "SAE_001"
+    assert info["subject"]["organization"] == "HPE-Networking"
+    assert info["subject"]["locality"] is None
+    assert info["issuer"]["common_name"] == "SAE_001"
+    assert info["public_key_algorithm"]
+
+    assert main._parse_cert_cached(der) is info
+
+
+def test_pem_to_der_accepts_url_encoded_pem():
+    pem = make_cert_pem()
+    assert main._pem_to_der(quote(pem)) == main._pem_to_der(pem)
+
+
+def test_pem_to_der_uses_first_certificate_of_a_chain():
+    leaf, issuer = make_cert_pem(), make_cert_pem()
+    der = main._pem_to_der("\n" + leaf + issuer)
+
+    assert der == main._pem_to_der(leaf)
+    assert x509.load_der_x509_certificate(der).public_bytes(serialization.Encoding.PEM).decode() == leaf
+
+
+def test_health_without_certificate(client):
+    r = client.get("/health", headers={"X-Client-Verified": "NONE"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["status"] == "healthy"
+    assert body["client_certificate"]["status"] == "no_certificate_provided"
+    assert body["client_certificate"]["nginx_verified"] == "NONE"
+    # Request headers are only echoed back in debug mode
+    assert "debug" not in body
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test nginx certificate header authentication in the API middleware.
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from src.api import middleware
+
+# These tests exercise the real nginx header authentication
+pytestmark = pytest.mark.real_auth
+
+
+def make_request(headers):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    return Request(scope)
+
+
+@pytest.mark.parametrize("dn,expected", [
+    ("CN=SAE_001,OU=Easy-KME Lab,O=HPE-Networking,ST=TX,C=US", "SAE_001"),
+    ("OU=Easy-KME Lab, CN=SAE_002 ,C=US", "SAE_002"),
+])
+def test_authenticate_client_extracts_cn(dn, expected):
+    request = make_request({"X-Client-Verified": "SUCCESS", "X-Client-DN": dn})
+    assert middleware.authenticate_client(request) == expected
+    assert request.state.sae_id == expected
+
+
+def test_authenticate_client_without_cn():
+    request = make_request({"X-Client-Verified": "SUCCESS", "X-Client-DN": "OU=Easy-KME Lab,C=US"})
+    with pytest.raises(HTTPException) as exc:
+        middleware.authenticate_client(request)
+    assert exc.value.status_code == 401
+
+
+def test_authenticate_client_header_fallback():
+    request = make_request({"X-SAE-ID": "SAE_003"})
+    assert middleware.authenticate_client(request) == "SAE_003"
+
+
+def test_get_sae_id_reuses_authenticated_request():
+    request = make_request({"X-SAE-ID": "SAE_003"})
+    request.state.sae_id = "SAE_001"
+    assert asyncio.run(middleware.get_sae_id(request)) == "SAE_001"
+
+
+def test_certificate_extension_reuses_authenticated_cert_info(monkeypatch):
+    request = make_request({
+        "X-Client-Verified": "SUCCESS",
+        "X-Client-DN": "CN=SAE_001,O=HPE-Networking",
+        "X-Client-Issuer": "CN=Easy-KME Root CA1",
+        "X-SSL-Protocol": "TLSv1.3",
+    })
+    sae_id = middleware.authenticate_client(request)
+
+    def fail(request):
+        raise AssertionError("nginx headers parsed twice")
+
+    monkeypatch.setattr(middleware, "get_nginx_certificate_info", fail)
+    extension = middleware.create_certificate_extension(request, sae_id)
+    assert extension["client_dn"] == "CN=SAE_001,O=HPE-Networking"
+    assert extension["ssl_protocol"] == "TLSv1.3"
+    assert extension["sae_id"] == "SAE_001"
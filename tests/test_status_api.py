@@ -1,51 +1,71 @@
 #!/usr/bin/env python3
-import os
-import json
-from pathlib import Path
+from src.models.data_models import SAERegistry
+from src.services.key_service import KeyService
 
-import pytest
-from fastapi.testclient import TestClient
 
-from src.main import app
-from src.config import get_settings
+# ETSI GS QKD 014 Status data format fields
+REQUIRED_STATUS_FIELDS = frozenset({
+    "source_KME_ID",
+    "target_KME_ID",
+    "master_SAE_ID",
+    "slave_SAE_ID",
+    "key_size",
+    "stored_key_count",
+    "max_key_count",
+    "max_key_per_request",
+    "max_key_size",
+    "min_key_size",
+    "max_SAE_ID_count",
+})
 
 
-def with_env(env):
-    return pytest.mark.usefixtures()(lambda f: f)
-
-
-def test_get_status_spec(monkeypatch):
-    client = TestClient(app)
-
-    # Monkeypatch authenticate_client to accept header SAE ID
-    def fake_authenticate(request):
-        return request.headers.get("x-sae-id", "SAE_001")
-
-    # Inject fake authenticator
-    from src.api import middleware
-    monkeypatch.setattr(middleware, "authenticate_client", fake_authenticate)
-
+def test_get_status_spec(client):
     # Call status for a target slave SAE
     resp = client.get("/api/v1/keys/SAE_002/status", headers={"x-sae-id": "SAE_001"})
     assert resp.status_code == 200
     body = resp.json()
 
     # ETSI StatusSpec fields
-    for field in [
-        "source_KME_ID",
-        "target_KME_ID",
-        "master_SAE_ID",
-        "slave_SAE_ID",
-        "key_size",
-        "stored_key_count",
-        "max_key_count",
-        "max_key_per_request",
-        "max_key_size",
-        "min_key_size",
-        "max_SAE_ID_count",
-    ]:
-        assert field in body, f"missing field {field}"
+    missing = REQUIRED_STATUS_FIELDS - body.keys()
+    assert not missing, f"missing fields: {missing}"
 
     assert isinstance(body["stored_key_count"], int)
     assert body["slave_SAE_ID"] == "SAE_002"
     assert body["master_SAE_ID"] == "SAE_001"
+
+
+def test_status_reflects_key_allocation(client, seeded_keys):
+    # seeded_keys has filled the pool, so this request does not trigger a refill
+    before = client.get("/api/v1/keys/SAE_002/status", headers={"x-sae-id": "SAE_001"}).json()
+    r = client.post("/api/v1/keys/SAE_002/enc_keys", json={"number": 2}, headers={"x-sae-id": "SAE_001"})
+    assert r.status_code == 200
+    after = client.get("/api/v1/keys/SAE_002/status", headers={"x-sae-id": "SAE_001"}).json()
+
+    assert after["stored_key_count"] == before["stored_key_count"] - 2
+
+
+def test_unhandled_error_returns_503(client_no_raise, monkeypatch):
+    def broken_status(self, master_sae_id=None, slave_sae_id=None):
+        raise RuntimeError("storage unavailable")
+
+    monkeypatch.setattr(KeyService, "get_status", broken_status)
+
+    resp = client_no_raise.get("/api/v1/keys/SAE_002/status",
+                      headers={"x-sae-id": "SAE_001", "Origin": "https://sae.example"})
+    assert resp.status_code == 503
+    assert resp.json() == {"detail": "Internal server error"}
+    # Produced inside the middleware stack, so CORS headers are still applied
+    assert "access-control-allow-origin" in resp.headers
+
+
+def test_status_payload_follows_sae_registration(client):
+    key_service = client.app.state.key_service
+    before = key_service.get_status(master_sae_id="SAE_001", slave_sae_id="SAE_002")
+
+    key_service.storage_service.upsert_sae(
+        SAERegistry(sae_id="SAE_STATUS", certificate_subject="CN=SAE_STATUS", certificate_serial="1")
+    )
+
+    # Seen without waiting for the cache TTL
+    after = key_service.get_status(master_sae_id="SAE_001", slave_sae_id="SAE_002")
+    assert after["registered_saes"] == before["registered_saes"] + 1
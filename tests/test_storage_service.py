@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Test the file-based storage service.
+"""
+
+import copy
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+
+from src.config import get_settings
+from src.models.data_models import Key, Session
+from src.services import storage_service
+from src.services.storage_service import StorageService
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    settings = copy.copy(get_settings())
+    settings.data_dir = str(tmp_path)
+    monkeypatch.setattr(storage_service, "get_settings", lambda: settings)
+    return StorageService()
+
+
+@pytest.fixture
+def background_storage(storage):
+    return StorageService(background_writes=True)
+
+
+def make_keys(n):
+    return [Key(key_id=f"key-{i}", key_material="AAAA", key_size=256) for i in range(n)]
+
+
+def test_journaled_keys_are_replayed_in_order(storage):
+    keys = make_keys(3)
+    storage.add_keys(keys)
+
+    used = keys[1].model_copy(update={"is_used": True, "master_sae_id": "SAE_001"})
+    storage.update_keys([used])
+
+    loaded = storage.get_keys()
+    assert [k.key_id for k in loaded] == ["key-0", "key-1", "key-2"]
+    assert loaded[1].is_used and loaded[1].master_sae_id == "SAE_001"
+    assert isinstance(loaded[0].created_at, datetime)
+    # Changes live in the journal until compaction
+    assert storage.keys_journal_file.exists()
+
+
+def test_malformed_stored_record_is_rejected(storage):
+    storage.keys_file.write_bytes(b'[{"key_id": "key-0", "key_material": "AAAA", "key_size": "large"}]')
+
+    with pytest.raises(ValidationError):
+        storage.get_keys()
+
+
+def test_compact_keys_folds_journal_into_snapshot(storage):
+    storage.add_keys(make_keys(2))
+    storage.compact_keys()
+
+    assert not storage.keys_journal_file.exists()
+    assert [k.key_id for k in storage.get_keys()] == ["key-0", "key-1"]
+
+
+def test_torn_journal_line_is_skipped(storage):
+    storage.add_keys(make_keys(1))
+    with open(storage.keys_journal_file, "ab") as f:
+        f.write(b'{"op": "add", "key": {"key_id"')
+
+    assert [k.key_id for k in storage.get_keys()] == ["key-0"]
+
+
+def test_get_key_index_follows_journal_and_external_writes(storage):
+    keys = make_keys(2)
+    storage.add_keys(keys)
+    assert storage.get_key("key-1").key_id == "key-1"
+    assert storage.get_key("missing") is None
+
+    storage.update_keys([keys[1].model_copy(update={"is_used": True})])
+    assert storage.get_key("key-1").is_used
+
+    # A second instance (e.g. another worker) writing the files invalidates the index
+    StorageService().save_keys(make_keys(1))
+    assert storage.get_key("key-1") is None
+
+
+def test_take_available_keys_pops_oldest_unallocated(storage):
+    storage.add_keys(make_keys(3))
+
+    taken = storage.take_available_keys(2)
+    assert [k.key_id for k in taken] == ["key-0", "key-1"]
+    for key in taken:
+        key.is_used = True
+    storage.update_keys(taken)
+
+    # Not enough left: nothing is taken
+    assert storage.take_available_keys(2) is None
+    assert [k.key_id for k in storage.take_available_keys(1)] == ["key-2"]
+
+
+def test_queued_session_snapshot_is_readable_and_flushed(background_storage):
+    storage = background_storage
+    storage.save_sessions([Session(session_id="s-1", master_sae_id="SAE_001", slave_sae_ids=["SAE_002"], key_ids=[])])
+    assert [s.session_id for s in storage.get_sessions()] == ["s-1"]
+
+    storage.flush()
+    assert b"s-1" in storage.sessions_file.read_bytes()
+
+
+def test_failed_background_write_is_retried_at_flush(tmp_path):
+    written = {}
+    failures = []
+
+    def write(path, data):
+        if failures:
+            raise failures.pop()
+        written[path] = data
+
+    writer = storage_service._BackgroundWriter(write)
+    path = tmp_path / "sessions.json"
+
+    # Fails in the writer thread, then again on the retry in flush()
+    failures.extend([OSError("disk full"), OSError("disk full")])
+    writer.submit(path, b"v1")
+    with pytest.raises(OSError):
+        writer.flush()
+    # The failed snapshot is kept and still served to readers
+    assert path not in written
+    assert writer.pending(path) == b"v1"
+
+    writer.flush()
+    assert written[path] == b"v1"
+    assert writer.pending(path) is None
+
+
+def test_stats_track_key_changes(storage):
+    keys = make_keys(3)
+    storage.add_keys(keys)
+    storage.update_keys([keys[0].model_copy(update={"is_used": True})])
+
+    stats = storage.stats()
+    assert stats["total_keys"] == 3
+    assert stats["available_keys"] == 2
+    assert stats["active_sessions"] == 0
+
+
+def test_atomic_update_journals_session_and_compacts_it(storage):
+    keys = make_keys(1)
+    storage.add_keys(keys)
+    used = keys[0].model_copy(update={"is_used": True})
+    session = Session(session_id="s-1", master_sae_id="SAE_001", slave_sae_ids=["SAE_002"], key_ids=["key-0"])
+    storage.atomic_update(keys=[used], sessions_append=[session])
+
+    assert storage.get_key("key-0").is_used
+    assert [s.session_id for s in storage.get_sessions()] == ["s-1"]
+    assert storage.stats()["active_sessions"] == 1
+
+    storage.compact_keys()
+    assert not storage.keys_journal_file.exists()
+    assert b"s-1" in storage.sessions_file.read_bytes()
+    assert [s.session_id for s in storage.get_sessions()] == ["s-1"]
+
+
+def test_key_count_uses_index(storage, monkeypatch):
+    storage.add_keys(make_keys(3))
+    storage.key_count()
+
+    monkeypatch.setattr(storage, "get_keys", lambda: pytest.fail("keys decoded again"))
+    storage.add_keys(make_keys(5)[3:])
+    assert storage.key_count() == 5